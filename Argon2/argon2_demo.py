@@ -0,0 +1,50 @@
+from newhash import argon2
+
+# the test vectors of RFC 9106, section 5
+PASSWORD = bytes([0x01]) * 32
+SALT = bytes([0x02]) * 16
+SECRET = bytes([0x03]) * 8
+ASSOCIATED_DATA = bytes([0x04]) * 12
+
+EXPECTED = {
+    "d": "512b391b6f1162975371d30919734294f868e3be3984f3c1a13a4db9fabe4acb",
+    "i": "c814d9d1dc7f37aa13f0d77f2494bda1c8de6b016dd388d29952a4c4672b6ce8",
+    "id": "0d640df58d78766c08c037a34a8b53c9d01ef0452d75b65eb52520e96b01e659",
+}
+
+# made by the reference implementation (argon2-cffi) for b"password"
+REFERENCE_HASH = "$argon2id$v=19$m=256,t=2,p=2$c29tZXNhbHQ$bQk8UB/VmZZF4Oo79iDXuL5/0ttZwg2f/5U52iv1cDc"
+
+def print_compare_results(actual, expect):
+    print("  ???", actual)
+    print("  >>>", expect)
+    if actual != expect:
+        print("         *** results do NOT agree ***")
+
+def main():
+
+    # RFC 9106 test vectors: t=3, m=32 KiB, p=4, 32-byte tags
+    for variant, expect in EXPECTED.items():
+        tag = argon2.argon2(
+            PASSWORD, SALT, time_cost=3, memory_cost=32, parallelism=4, hash_len=32,
+            variant=variant, secret=SECRET, associated_data=ASSOCIATED_DATA,
+        )
+        print("Argon2%s of the RFC 9106 inputs:" % variant)
+        print_compare_results(tag.hex(), expect)
+
+    print()
+
+    # a PHC string from the reference implementation
+    print("verify_password of", REFERENCE_HASH)
+    print_compare_results(argon2.verify_password(REFERENCE_HASH, b"password"), True)
+    print_compare_results(argon2.verify_password(REFERENCE_HASH, b"Password"), False)
+
+    print()
+
+    # a new PHC string, with small costs so the demo runs quickly
+    encoded = argon2.hash_password(b"password", time_cost=2, memory_cost=256, parallelism=2)
+    print("hash_password:", encoded)
+    print("Verifies:", argon2.verify_password(encoded, b"password"))
+
+if __name__ == "__main__":
+    main()
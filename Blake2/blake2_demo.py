@@ -1,5 +1,5 @@
 import sys, binascii, platform
-from blake2 import BLAKE2b
+from newhash.blake2 import BLAKE2b, BLAKE2Xb
 
 
 #-----------------------------------------------------------------------
@@ -12,7 +12,7 @@ def print_compare_results(actual, expect):
     
 #-----------------------------------------------------------------------
 
-def demo_bfile(filename='blake2.py'):
+def demo_bfile(filename=__file__):
     digest_size = 32
     
     if len(sys.argv) == 2:
@@ -183,6 +183,62 @@ def tree():
         + '3ad2a9b37c6070e374c7a8c508fe20ca86b6ed54e286e93a0318e95e881db5aa')
 
 
+#-----------------------------------------------------------------------
+
+def demo_empty():
+    digest_size = 64
+    
+    print('')
+    print('BLAKE2b of the empty message (%d-byte digest) - empty' % digest_size)
+    
+    actual = BLAKE2b(digest_size=digest_size).hexdigest()
+    expect = ('786a02f742015903c6c6fd852552d272912f4740e15847618a86e217f71f5419'
+            + 'd25e1031afee585313896444934eb04b903a685b1448b755d56f701afe9be2ce')
+    print_compare_results(actual, expect)
+
+
+#-----------------------------------------------------------------------
+
+def demo_digest_twice():
+    digest_size = 64
+    
+    print('')
+    print('BLAKE2b digest() twice, then more data (%d-byte digest) - digest' % digest_size)
+    
+    b2 = BLAKE2b(b'hello', digest_size)
+    first = b2.hexdigest()
+    
+    # digest() leaves the hasher open, so it can be called again
+    print_compare_results(b2.hexdigest(), first)
+    
+    b2.update(b' world')
+    actual = b2.hexdigest()
+    expect = ('021ced8799296ceca557832ab941a50b4a11f83478cf141f51f933f653ab9fbc'
+            + 'c05a037cddbed06e309bf334942c4e58cdf1a46e237911ccd7fcf9787cbc7fd0')
+    print_compare_results(actual, expect)
+
+
+#-----------------------------------------------------------------------
+
+def demo_xof():
+    data        = b'hello'
+    digest_size = 200
+    
+    print('')
+    print('BLAKE2Xb of %s (%d-byte output) - xof' % (data, digest_size))
+    
+    xof = BLAKE2Xb(data, digest_size)
+    expect = xof.hexdigest()
+    
+    # stream the same output in uneven pieces
+    streamed = BLAKE2Xb(data, digest_size)
+    actual = b''.join(streamed.read(n) for n in (1, 63, 100, 36)).hex()
+    print_compare_results(actual, expect)
+    
+    # output block 2 on its own
+    print('  block 2: %s' % xof.output_block(2).hex())
+
+
 #-----------------------------------------------------------------------
 #-----------------------------------------------------------------------
 
@@ -206,6 +262,14 @@ if __name__ == '__main__':
         
         tree()
     
+    if 1:
+        # digest() does not finalize
+        demo_empty()
+        demo_digest_twice()
+    
+    if 1:
+        demo_xof()
+    
     print('')
 
 #-----------------------------------------------------------------------
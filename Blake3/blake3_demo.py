@@ -1,4 +1,4 @@
-import blake3
+from newhash import blake3
 import secrets
 
 def main():
@@ -37,6 +37,20 @@ def main():
     derived_key = kdf.finalize()
     print("Output of key derivation:", derived_key)
 
+    print()
+
+    # subtree hashing, as if each 2 KiB shard were hashed on another machine
+    blob = bytes(range(256)) * 20
+    shards = [
+        blake3.hash_subtree(blob[offset : offset + 2048], offset // blake3.CHUNK_LEN)
+        for offset in range(0, len(blob), 2048)
+    ]
+    output5 = blake3.finalize_root(shards)
+    hash5 = blake3.Hasher()
+    hash5.update(blob)
+    print("Output of subtree hash:", output5)
+    print("Matches Hasher:", output5 == hash5.finalize())
+
 if __name__ == "__main__":
     main()
 
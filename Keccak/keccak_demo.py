@@ -0,0 +1,26 @@
+from newhash import keccak
+
+def main():
+
+    # SHA3-256
+    sha3 = keccak.SHA3_256()
+    sha3.update(b"Hello, World!")
+    print("SHA3-256:", sha3.hexdigest())
+
+    print()
+
+    # SHAKE128, squeezed a piece at a time
+    shake = keccak.SHAKE128(b"Hello, World!")
+    print("SHAKE128 first 16 bytes:", shake.squeeze(16).hex())
+    print("SHAKE128 next 16 bytes: ", shake.squeeze(16).hex())
+
+    print()
+
+    # many records at once (requires NumPy)
+    records = [b"record %d" % i for i in range(1000)]
+    digests = keccak.sha3_many(records, "sha3_256")
+    print("Batched SHA3-256 of", len(records), "records, last:", digests[-1].hex())
+    print("Matches SHA3_256:", digests[-1] == keccak.SHA3_256(records[-1]).digest())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+from newhash import streebog
+
+# the two examples of GOST R 34.11-2012, appendix A
+M1 = b"012345678901234567890123456789012345678901234567890123456789012"
+M2 = "Се ветри, Стрибожи внуци, веютъ с моря стрелами на храбрыя плъкы Игоревы".encode("cp1251")
+
+EXPECTED = [
+    ("M1", M1, 64, "1b54d01a4af5b9d5cc3d86d68d285462b19abc2475222f35c085122be4ba1ffa"
+                   "00ad30f8767b3a82384c6574f024c311e2a481332b08ef7f41797891c1646f48"),
+    ("M1", M1, 32, "9d151eefd8590b89daa6ba6cb74af9275dd051026bb149a452fd84e5e57b5500"),
+    ("M2", M2, 64, "1e88e62226bfca6f9994f1f2d51569e0daf8475a3b0fe61a5300eee46d961376"
+                   "035fe83549ada2b8620fcd7c496ce5b33f0cb9dddc2b6460143b03dabac9fb28"),
+    ("M2", M2, 32, "9dd2fe4e90409e5da87f53976d7405b0c0cac628fc669a741d50063c557e8f50"),
+]
+
+def check_vectors():
+    for label, message, digest_size, expect in EXPECTED:
+        hasher = streebog.streebog512 if digest_size == 64 else streebog.streebog256
+        actual = hasher(message).hexdigest()
+        print("Streebog-%d of %s:" % (8 * digest_size, label))
+        print("  ???", actual)
+        print("  >>>", expect)
+        if actual != expect:
+            print("         *** results do NOT agree ***")
+
+def main():
+
+    # test vectors of the standard
+    check_vectors()
+
+    print()
+
+    message = b"Hello, World!"
+
+    # incremental hashing
+    h512 = streebog.streebog512()
+    h512.update(message)
+    print("Streebog-512:", h512.hexdigest())
+
+    h256 = streebog.streebog256(message)
+    print("Streebog-256:", h256.hexdigest())
+
+    print()
+
+    # many messages at once (requires NumPy)
+    messages = [b"message %d" % i for i in range(100)]
+    digests = streebog.streebog_many(messages, digest_size=32)
+    print("Batched Streebog-256 of", len(messages), "messages, last:", digests[-1].hex())
+    print("Matches streebog256:", digests[-1] == streebog.streebog256(messages[-1]).digest())
+
+if __name__ == "__main__":
+    main()
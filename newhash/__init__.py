@@ -0,0 +1,100 @@
+"""
+Pure-Python hash algorithms with a hashlib-style interface.
+
+Algorithm modules are imported on first use, so importing the package (or
+calling new() for one algorithm) does not pay for the others.
+
+    >>> import newhash
+    >>> newhash.new("blake3", b"foobar").hexdigest()[:16]
+    'aa51dcd43d5c6c52'
+"""
+from __future__ import annotations
+
+import importlib
+
+# algorithm name -> (module, constructor); the constructor takes the initial
+# data as its first argument and the algorithm's parameters as keywords
+_registry = {
+    "blake2b": ("blake2", "BLAKE2b"),
+    "blake2xb": ("blake2", "BLAKE2Xb"),
+    "blake3":  ("blake3", "new"),
+    "sha3_224":  ("keccak", "SHA3_224"),
+    "sha3_256":  ("keccak", "SHA3_256"),
+    "sha3_384":  ("keccak", "SHA3_384"),
+    "sha3_512":  ("keccak", "SHA3_512"),
+    "shake_128": ("keccak", "SHAKE128"),
+    "shake_256": ("keccak", "SHAKE256"),
+    "streebog256": ("streebog", "streebog256"),
+    "streebog512": ("streebog", "streebog512"),
+}
+
+# algorithm modules plus the helpers built on top of them
+_submodules = frozenset(module for module, _ in _registry.values()) | {"argon2", "dispatch", "multi", "pool", "readahead", "service"}
+
+algorithms_available = frozenset(_registry)
+
+
+def _load(module_name: str):
+    return importlib.import_module("." + module_name, __name__)
+
+
+def new(name: str, data: bytes = b"", **params):
+    """
+    Return a new hash object for the named algorithm, like hashlib.new().
+
+    Args:
+        name (str): one of algorithms_available
+        data (bytes, optional): initial input. Defaults to b"".
+        **params: algorithm parameters such as digest_size, key or salt
+
+    Raises:
+        ValueError: if the algorithm is not available
+
+    Returns:
+        a hash object with name, digest_size, block_size, update, digest,
+        hexdigest and copy
+    """
+    try:
+        module_name, constructor = _registry[name.lower()]
+    except KeyError:
+        raise ValueError("unsupported hash type " + name) from None
+    return getattr(_load(module_name), constructor)(data, **params)
+
+
+def _check_length(hasher, length: int | None) -> None:
+    # extendable-output functions have digest_size 0 and need a length
+    if length is None:
+        if not hasher.digest_size:
+            raise ValueError("%s is an extendable-output function and needs a length" % hasher.name)
+    elif length < 1:
+        raise ValueError("length must be positive")
+    elif hasher.digest_size and length != hasher.digest_size:
+        raise ValueError(
+            "length %d does not match the %d-byte digest of %s" % (length, hasher.digest_size, hasher.name)
+        )
+
+
+def _digest(hasher, length: int | None = None) -> bytes:
+    """
+    Finish a hash object from new(). length is the output length of the
+    extendable-output functions (shake_128, shake_256, and blake2xb without a
+    digest_size); other algorithms take their digest_size from new().
+    """
+    _check_length(hasher, length)
+    if hasher.digest_size:
+        return hasher.digest()
+    if hasattr(hasher, "read"):
+        # BLAKE2Xb of unknown length streams its output
+        return hasher.copy().read(length)
+    return hasher.digest(length)
+
+
+def __getattr__(name: str):
+    # lazily import submodules on attribute access, e.g. newhash.blake3
+    if name in _submodules:
+        return _load(name)
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | _submodules)
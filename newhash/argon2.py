@@ -0,0 +1,350 @@
+"""
+Argon2 (RFC 9106) password hashing: Argon2d, Argon2i and Argon2id, version 0x13.
+
+H and H' are computed with newhash.blake2.BLAKE2b. The memory matrix is one
+contiguous NumPy uint64 array of shape (lanes, lane_length, 128), a block
+being 128 64-bit words. The BlaMka compression G works on whole arrays: the
+eight row permutations of a block run as one vectorized P, and so do the
+eight column permutations.
+
+Lanes are independent within a segment, so instead of one thread per lane
+all lanes advance together: every step computes the same block column in
+each lane with a single call to G on a (lanes, 128) array. The NumPy
+overhead of a step is then paid once for all lanes. Requires NumPy.
+
+    tag = argon2id(b"password", b"somesalt", time_cost=3, memory_cost=65536, parallelism=4)
+    encoded = hash_password(b"password")
+    verify_password(encoded, b"password")
+"""
+from __future__ import annotations
+
+import base64
+import hmac
+import os
+import struct
+
+from .blake2 import BLAKE2b
+
+VERSION = 0x13
+ARGON2D = 0
+ARGON2I = 1
+ARGON2ID = 2
+VARIANTS = {"d": ARGON2D, "i": ARGON2I, "id": ARGON2ID}
+
+BLOCK_WORDS = 128
+BLOCK_LEN = 8 * BLOCK_WORDS
+SYNC_POINTS = 4
+
+MASK32 = 0xFFFFFFFF
+
+# word order of the diagonal step of P: (v0, v5, v10, v15), (v1, v6, v11, v12), ...
+_DIAGONALS = [0, 1, 2, 3, 5, 6, 7, 4, 10, 11, 8, 9, 15, 12, 13, 14]
+
+
+def blake2b_long(data: bytes, length: int) -> bytes:
+    """
+    The variable-length hash H' of Argon2.
+
+    Args:
+        data (bytes): the input
+        length (int): output length in bytes
+
+    Returns:
+        bytes: the hash
+    """
+    data = struct.pack("<I", length) + bytes(data)
+    if length <= BLAKE2b.OUTBYTES:
+        return BLAKE2b(data, digest_size=length).digest()
+    r = -(-length // 32) - 2
+    v = BLAKE2b(data).digest()
+    out = [v[:32]]
+    for _ in range(r - 1):
+        v = BLAKE2b(v).digest()
+        out.append(v[:32])
+    out.append(BLAKE2b(v, digest_size=length - 32 * r).digest())
+    return b"".join(out)
+
+
+def _fbla(x, y, t) -> None:
+    # x = x + y + 2 * lo(x) * lo(y), in place; t is scratch of the same shape
+    t[...] = x
+    t &= MASK32
+    t *= y & MASK32
+    t <<= 1
+    x += y
+    x += t
+
+
+def _xor_rotr(x, y, n: int) -> None:
+    # x = (x ^ y) >>> n, in place
+    x ^= y
+    x[...] = (x >> n) | (x << (64 - n))
+
+
+def _gb(v) -> None:
+    # the four BlaMka G functions of P, one per column of the 4x4 word matrix
+    a, b, c, d = v[0:4], v[4:8], v[8:12], v[12:16]
+    t = a.copy()
+    _fbla(a, b, t)
+    _xor_rotr(d, a, 32)
+    _fbla(c, d, t)
+    _xor_rotr(b, c, 24)
+    _fbla(a, b, t)
+    _xor_rotr(d, a, 16)
+    _fbla(c, d, t)
+    _xor_rotr(b, c, 63)
+
+
+def _permute(v) -> None:
+    """
+    P on every column of the uint64 array v of shape (16, m), in place. Word
+    k of the inputs is row k, so each G step is four contiguous slices.
+    """
+    _gb(v)
+    w = v[_DIAGONALS]
+    _gb(w)
+    v[_DIAGONALS] = w
+
+
+def compress(x, y):
+    """
+    The compression function G on n pairs of blocks.
+
+    Args:
+        x, y (numpy.ndarray): uint64 arrays of shape (n, 128)
+
+    Returns:
+        numpy.ndarray: G(x, y), of shape (n, 128)
+    """
+    n = len(x)
+    r = x ^ y
+    # word 16 * row + 2 * i + e of a block is r[:, row, i, e]; the rows
+    # (i, e) and then the columns (row, e) become the 16 words of P
+    q = r.reshape(n, 8, 8, 2).transpose(2, 3, 0, 1).copy().reshape(16, -1)
+    _permute(q)
+    q = q.reshape(8, 2, n, 8).transpose(3, 1, 2, 0).copy().reshape(16, -1)
+    _permute(q)
+    q = q.reshape(8, 2, n, 8).transpose(2, 0, 3, 1).copy().reshape(n, BLOCK_WORDS)
+    q ^= r
+    return q
+
+
+def _addresses(variant: int, pass_n: int, slice_n: int, lanes: int, memory_blocks: int,
+               passes: int, segment_length: int):
+    """The pseudo-random values of a data-independent segment, for all lanes."""
+    import numpy as np
+
+    count = -(-segment_length // BLOCK_WORDS)
+    inputs = np.zeros((lanes, count, BLOCK_WORDS), dtype=np.uint64)
+    inputs[:, :, 0] = pass_n
+    inputs[:, :, 1] = np.arange(lanes)[:, None]
+    inputs[:, :, 2] = slice_n
+    inputs[:, :, 3] = memory_blocks
+    inputs[:, :, 4] = passes
+    inputs[:, :, 5] = variant
+    inputs[:, :, 6] = np.arange(1, count + 1)
+    inputs = inputs.reshape(-1, BLOCK_WORDS)
+    zero = np.zeros_like(inputs)
+    addresses = compress(zero, compress(zero, inputs))
+    return addresses.reshape(lanes, -1)[:, :segment_length]
+
+
+def _reference_column(pass_n: int, slice_n: int, index: int, j1: int, same_lane: bool,
+                      lane_length: int, segment_length: int) -> int:
+    # the column of the reference block, as index_alpha in the reference code
+    if pass_n == 0:
+        if slice_n == 0 or same_lane:
+            area = slice_n * segment_length + index - 1
+        else:
+            area = slice_n * segment_length - (index == 0)
+        start = 0
+    else:
+        if same_lane:
+            area = lane_length - segment_length + index - 1
+        else:
+            area = lane_length - segment_length - (index == 0)
+        start = 0 if slice_n == SYNC_POINTS - 1 else (slice_n + 1) * segment_length
+    relative = area - 1 - ((area * ((j1 * j1) >> 32)) >> 32)
+    return (start + relative) % lane_length
+
+
+def _fill_memory(matrix, variant: int, passes: int, memory_blocks: int) -> None:
+    lanes, lane_length = matrix.shape[:2]
+    segment_length = lane_length // SYNC_POINTS
+    lane_range = range(lanes)
+    for pass_n in range(passes):
+        for slice_n in range(SYNC_POINTS):
+            independent = variant == ARGON2I or (
+                variant == ARGON2ID and pass_n == 0 and slice_n < SYNC_POINTS // 2
+            )
+            if independent:
+                addresses = _addresses(
+                    variant, pass_n, slice_n, lanes, memory_blocks, passes, segment_length
+                )
+            first = 2 if pass_n == 0 and slice_n == 0 else 0
+            for index in range(first, segment_length):
+                column = slice_n * segment_length + index
+                # column - 1 is -1, the last column, at the start of a pass
+                prev = matrix[:, column - 1]
+                rand = (addresses[:, index] if independent else prev[:, 0]).tolist()
+                ref_lanes = []
+                ref_columns = []
+                for lane in lane_range:
+                    ref_lane = lane if pass_n == 0 and slice_n == 0 else (rand[lane] >> 32) % lanes
+                    ref_lanes.append(ref_lane)
+                    ref_columns.append(_reference_column(
+                        pass_n, slice_n, index, rand[lane] & MASK32, ref_lane == lane,
+                        lane_length, segment_length,
+                    ))
+                block = compress(prev, matrix[ref_lanes, ref_columns])
+                if pass_n:
+                    matrix[:, column] ^= block
+                else:
+                    matrix[:, column] = block
+
+
+def argon2(
+    password: bytes,
+    salt: bytes,
+    time_cost: int,
+    memory_cost: int,
+    parallelism: int,
+    hash_len: int = 32,
+    variant: str = "id",
+    secret: bytes = b"",
+    associated_data: bytes = b"",
+) -> bytes:
+    """
+    Compute a raw Argon2 tag.
+
+    Args:
+        password (bytes): the password P
+        salt (bytes): the salt S, at least 8 bytes
+        time_cost (int): number of passes t
+        memory_cost (int): memory size m in KiB, at least 8 * parallelism
+        parallelism (int): number of lanes p
+        hash_len (int, optional): tag length in bytes, at least 4. Defaults to 32.
+        variant (str, optional): "d", "i" or "id". Defaults to "id".
+        secret (bytes, optional): the secret value K
+        associated_data (bytes, optional): the associated data X
+
+    Returns:
+        bytes: the tag
+    """
+    import numpy as np
+
+    if variant not in VARIANTS:
+        raise ValueError("variant must be 'd', 'i' or 'id'")
+    if len(salt) < 8:
+        raise ValueError("salt must be at least 8 bytes")
+    if time_cost < 1:
+        raise ValueError("time_cost must be at least 1")
+    if not 1 <= parallelism < 1 << 24:
+        raise ValueError("parallelism must be between 1 and 2**24 - 1")
+    if memory_cost < 8 * parallelism:
+        raise ValueError("memory_cost must be at least 8 * parallelism")
+    if hash_len < 4:
+        raise ValueError("hash_len must be at least 4")
+    y = VARIANTS[variant]
+
+    def field(value: bytes) -> bytes:
+        return struct.pack("<I", len(value)) + bytes(value)
+
+    h0 = BLAKE2b(
+        struct.pack("<IIIIII", parallelism, hash_len, memory_cost, time_cost, VERSION, y)
+        + field(password) + field(salt) + field(secret) + field(associated_data)
+    ).digest()
+
+    memory_blocks = parallelism * SYNC_POINTS * (memory_cost // (parallelism * SYNC_POINTS))
+    lane_length = memory_blocks // parallelism
+    matrix = np.empty((parallelism, lane_length, BLOCK_WORDS), dtype=np.uint64)
+    for lane in range(parallelism):
+        for column in (0, 1):
+            block = blake2b_long(h0 + struct.pack("<II", column, lane), BLOCK_LEN)
+            matrix[lane, column] = np.frombuffer(block, dtype="<u8")
+
+    _fill_memory(matrix, y, time_cost, memory_blocks)
+
+    final = np.bitwise_xor.reduce(matrix[:, -1], axis=0)
+    return blake2b_long(final.astype("<u8").tobytes(), hash_len)
+
+
+def argon2d(password: bytes, salt: bytes, time_cost: int, memory_cost: int, parallelism: int,
+            hash_len: int = 32, **params) -> bytes:
+    """Argon2d; see argon2."""
+    return argon2(password, salt, time_cost, memory_cost, parallelism, hash_len, "d", **params)
+
+
+def argon2i(password: bytes, salt: bytes, time_cost: int, memory_cost: int, parallelism: int,
+            hash_len: int = 32, **params) -> bytes:
+    """Argon2i; see argon2."""
+    return argon2(password, salt, time_cost, memory_cost, parallelism, hash_len, "i", **params)
+
+
+def argon2id(password: bytes, salt: bytes, time_cost: int, memory_cost: int, parallelism: int,
+             hash_len: int = 32, **params) -> bytes:
+    """Argon2id; see argon2."""
+    return argon2(password, salt, time_cost, memory_cost, parallelism, hash_len, "id", **params)
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii").rstrip("=")
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def hash_password(
+    password: bytes,
+    salt: bytes | None = None,
+    time_cost: int = 3,
+    memory_cost: int = 65536,
+    parallelism: int = 4,
+    hash_len: int = 32,
+    variant: str = "id",
+) -> str:
+    """
+    Hash a password into the PHC string format used by the reference
+    implementation, e.g. "$argon2id$v=19$m=65536,t=3,p=4$<salt>$<tag>".
+
+    Args:
+        password (bytes): the password
+        salt (bytes, optional): the salt. Defaults to 16 random bytes.
+        time_cost, memory_cost, parallelism, hash_len, variant: as for argon2.
+            The defaults are the second recommended option of RFC 9106.
+
+    Returns:
+        str: the encoded hash
+    """
+    if salt is None:
+        salt = os.urandom(16)
+    tag = argon2(password, salt, time_cost, memory_cost, parallelism, hash_len, variant)
+    return "$argon2%s$v=%d$m=%d,t=%d,p=%d$%s$%s" % (
+        variant, VERSION, memory_cost, time_cost, parallelism, _b64encode(salt), _b64encode(tag)
+    )
+
+
+def verify_password(encoded: str, password: bytes) -> bool:
+    """
+    Check a password against a hash from hash_password.
+
+    Args:
+        encoded (str): the encoded hash
+        password (bytes): the password to check
+
+    Returns:
+        bool: whether the password matches
+    """
+    try:
+        _, name, version, cost, salt, tag = encoded.split("$")
+        variant = name[len("argon2"):]
+        if not name.startswith("argon2") or version != "v=%d" % VERSION:
+            raise ValueError
+        params = dict(item.split("=") for item in cost.split(","))
+        salt, tag = _b64decode(salt), _b64decode(tag)
+        memory_cost, time_cost, parallelism = int(params["m"]), int(params["t"]), int(params["p"])
+    except (ValueError, KeyError):
+        raise ValueError("invalid Argon2 hash: " + encoded) from None
+    computed = argon2(password, salt, time_cost, memory_cost, parallelism, len(tag), variant)
+    return hmac.compare_digest(computed, tag)
@@ -1,5 +1,4 @@
-import struct, binascii, copy
-from ctypes import *
+import struct
 
 MASK8BITS   = 0xFF
 MASK16BITS  = 0xFFFF
@@ -37,23 +36,21 @@ class BLAKE2(object):
     def _init(self, key=b''):
         assert len(key) <= self.KEYBYTES
         # load parameters
-        P = self.PARAMS()
-        P.F.digest_size      = self.digest_size
-        P.F.key_length       = len(key)
-        P.F.fanout           = self.fanout
-        P.F.depth            = self.depth
-        P.F.leaf_size        = self.leaf_size
-        P.F.node_offset_lo   = self.node_offset & MASK32BITS
-        P.F.node_offset_hi   = self.node_offset >> 32
-        P.F.node_depth       = self.node_depth
-        P.F.inner_size       = self.inner_size
-        P.F.salt   = (self.salt + 
-                (chr(0).encode())*(self.SALTBYTES-len(self.salt)))
-        P.F.person = (self.person + 
-                (chr(0).encode())*(self.PERSONALBYTES-len(self.person)))
+        P = struct.unpack('<8%s' % self.WORDFMT, struct.pack(self.PARAMFMT,
+                self.digest_size,
+                len(key),
+                self.fanout,
+                self.depth,
+                self.leaf_size,
+                self.node_offset & MASK32BITS,
+                (self.node_offset >> 32) | self.xof_length,
+                self.node_depth,
+                self.inner_size,
+                b'',
+                self.salt,
+                self.person))
         
-        
-        self.h               = [self.IV[i] ^ P.W[i] for i in range(8)]
+        self.h               = [self.IV[i] ^ P[i] for i in range(8)]
         
         self.totbytes        = 0
         self.t               = [0]*2
@@ -70,14 +67,15 @@ class BLAKE2(object):
         if self.data:
             self.update(self.data)
 
-    def _compress(self, block):
+    def _compress(self, block, offset=0):
         """
         Performs the compression step of Blake2b on the given block.
         Applies the G function to modify the interal state in 12 rounds.
         As according to Blake2 section A.1 BLAKE2b and section 2.4 Fewer Constants 
 
         Args:
-            block (bytes): The input block to be compressed.
+            block (bytes): Buffer holding the input block to be compressed.
+            offset (int): Position of the block within the buffer.
         """
         MASKBITS  = self.MASKBITS
         WORDBITS  = self.WORDBITS
@@ -94,7 +92,7 @@ class BLAKE2(object):
         WB_ROT4   = WORDBITS - ROT4
         
         # convert block (bytes) into 16 LE words
-        m = struct.unpack_from('<16%s' % self.WORDFMT, bytes(block))
+        m = struct.unpack_from('<16%s' % self.WORDFMT, block, offset)
         
         # First initializes 16-word internal state
         v = [0]*16
@@ -187,18 +185,27 @@ class BLAKE2(object):
         
         BLOCKBYTES = self.BLOCKBYTES
         
+        # Work on a memoryview so full blocks are compressed straight out of
+        # the caller's buffer (e.g. the reused readinto() buffer of
+        # hashlib.file_digest). Only a trailing partial block is copied.
+        data = memoryview(data).cast('B')
         datalen = len(data)
         dataptr = 0
-        while True:
-            if len(self.buf) > BLOCKBYTES:
-                self._increment_counter(BLOCKBYTES)
-                self._compress(self.buf[:BLOCKBYTES])
-                self.buf = self.buf[BLOCKBYTES:]
-            if dataptr < datalen:
-                self.buf += data[dataptr:dataptr + BLOCKBYTES]
-                dataptr += BLOCKBYTES
-            else:
-                break
+        if self.buf:
+            dataptr = BLOCKBYTES - len(self.buf)
+            self.buf += data[:dataptr]
+        # the last block is kept buffered for final(), so a block is only
+        # compressed once more input follows it
+        if len(self.buf) == BLOCKBYTES and dataptr < datalen:
+            self._increment_counter(BLOCKBYTES)
+            self._compress(self.buf)
+            self.buf = b''
+        while datalen - dataptr > BLOCKBYTES:
+            self._increment_counter(BLOCKBYTES)
+            self._compress(data, dataptr)
+            dataptr += BLOCKBYTES
+        if dataptr < datalen:
+            self.buf = bytes(data[dataptr:])
     
     def final(self):
         """
@@ -208,8 +215,8 @@ class BLAKE2(object):
         Returns:
             bytes: The digest (hash value) of the input data.
         """
-        # check if any residue remaining to be processed
-        if not self.finalized and len(self.buf):
+        # process the last (possibly empty) block
+        if not self.finalized:
             self._increment_counter(len(self.buf))
             self._set_lastblock()
             # add padding
@@ -222,10 +229,20 @@ class BLAKE2(object):
         self.finalized = True
         return self.digest_[:self.digest_size]
     
-    digest = final
+    def digest(self):
+        """
+        Return the digest of the data passed to update so far. Unlike final,
+        the hash object can still be updated afterwards.
+        
+        Returns:
+            bytes: The digest (hash value) of the input data.
+        """
+        if self.finalized:
+            return self.digest_[:self.digest_size]
+        return self.copy().final()
     
     def hexdigest(self):
-        return binascii.hexlify(self.final()).decode()
+        return self.digest().hex()
     
     def _set_lastblock(self):
         if self.last_node:
@@ -240,10 +257,17 @@ class BLAKE2(object):
     # common utility functions
     
     def copy(self):
-        return copy.deepcopy(self)
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other.h = list(self.h)
+        other.t = list(self.t)
+        other.f = list(self.f)
+        return other
 
 class BLAKE2b(BLAKE2):
     
+    name          = 'blake2b'
+    
     WORDBITS      = 64
     WORDBYTES     = 8
     MASKBITS      = MASK64BITS
@@ -253,8 +277,13 @@ class BLAKE2b(BLAKE2):
     BLOCKBYTES    = 128
     OUTBYTES      = 64
     KEYBYTES      = 64
-    SALTBYTES     = 16  # see also hardcoded value in ParamFields64
-    PERSONALBYTES = 16  # see also hardcoded value in ParamFields64
+    SALTBYTES     = 16  # see also hardcoded value in PARAMFMT
+    PERSONALBYTES = 16  # see also hardcoded value in PARAMFMT
+    
+    # parameter block: digest_size, key_length, fanout, depth, leaf_size,
+    # node_offset (lo, hi | xof_length), node_depth, inner_size, reserved,
+    # salt, person
+    PARAMFMT      = '<BBBBIIIBB14s16s16s'
     
     # 64-bit words IV for Blake2b
     IV = [
@@ -276,7 +305,7 @@ class BLAKE2b(BLAKE2):
     def __init__(self, data=b'', digest_size=64, key=b'', 
                        salt=b'', person=b'', fanout=1, depth=1, 
                        leaf_size=0, node_offset=0, node_depth=0, 
-                       inner_size=0, last_node=False):
+                       inner_size=0, last_node=False, xof_length=0):
 
         assert 1 <= digest_size <= self.OUTBYTES
         assert len(key)         <= self.KEYBYTES
@@ -288,32 +317,9 @@ class BLAKE2b(BLAKE2):
         assert 0 <= node_offset <= MASK64BITS
         assert 0 <= node_depth  <= MASK8BITS
         assert 0 <= inner_size  <= MASK8BITS
-        
-        # - - - - - - - - - - - - - - - - - - - - - - - - -
-        # use ctypes LittleEndianStructure and Union as a 
-        # convenient way to organize complex structs, convert 
-        # to little endian, and access by words
-        class ParamFields64(LittleEndianStructure):
-            _fields_ = [("digest_size",    c_ubyte),
-                        ("key_length",     c_ubyte),
-                        ("fanout",         c_ubyte),
-                        ("depth",          c_ubyte),
-                        ("leaf_size",      c_uint32),
-                        ("node_offset_lo", c_uint32),
-                        ("node_offset_hi", c_uint32),
-                        ("node_depth",     c_ubyte),
-                        ("inner_size",     c_ubyte),
-                        ("reserved",       c_char * 14),
-                        ("salt",           c_char * 16),
-                        ("person",         c_char * 16),
-                       ]
-        
-        class Params64(Union):
-            _fields_ = [("F", ParamFields64),
-                        ("W", c_uint64 * 8),
-                       ]
-        
-        self.PARAMS = Params64
+        assert 0 <= xof_length  <= MASK32BITS
+        # BLAKE2X splits node_offset into a 32-bit offset and the XOF length
+        assert xof_length == 0 or node_offset <= MASK32BITS
         
         # key is passed as an argument; all other variables are 
         # defined as instance variables
@@ -328,6 +334,134 @@ class BLAKE2b(BLAKE2):
         self.node_depth   = node_depth
         self.inner_size   = inner_size
         self.last_node    = last_node
+        self.xof_length   = xof_length
                                   
         # now call init routine common to BLAKE2b and BLAKE2s
         self._init(key=key)
+
+
+def _xof_block(h0, i, xof_length, salt, person):
+    """
+    BLAKE2X output block i: BLAKE2b of the root hash h0 with the parameters
+    of an output node. Module level so it can be sent to a process pool.
+    """
+    if xof_length == BLAKE2Xb.UNKNOWN_LENGTH:
+        digest_size = BLAKE2b.OUTBYTES
+    else:
+        digest_size = min(BLAKE2b.OUTBYTES, xof_length - i*BLAKE2b.OUTBYTES)
+    return BLAKE2b(h0, digest_size=digest_size, salt=salt, person=person,
+                   fanout=0, depth=0, leaf_size=BLAKE2b.OUTBYTES,
+                   node_offset=i, inner_size=BLAKE2b.OUTBYTES,
+                   xof_length=xof_length).digest()
+
+class BLAKE2Xb(object):
+    """
+    BLAKE2Xb extendable-output function, as in the BLAKE2X specification.
+    
+    The input is hashed into a 64-byte root hash h0 by BLAKE2b with the XOF
+    length in its parameter block. Output block i is then BLAKE2b(h0) with
+    node_offset i, so blocks are independent: read() streams them,
+    output_block() gives random access, and output_blocks() can compute many
+    of them in an executor.
+    
+    Args:
+        data (bytes): Initial input.
+        digest_size (int): Output length in bytes, or None if it is not known
+            in advance (then up to 2**32 blocks can be read).
+        key, salt, person (bytes): As for BLAKE2b.
+    """
+    
+    name          = 'blake2xb'
+    block_size    = BLAKE2b.BLOCKBYTES
+    
+    # xof_length value for an output length that is not known in advance
+    UNKNOWN_LENGTH = MASK32BITS
+    
+    def __init__(self, data=b'', digest_size=None, key=b'', salt=b'', person=b''):
+        if digest_size is None:
+            xof_length = self.UNKNOWN_LENGTH
+            self.digest_size = 0
+        else:
+            assert 1 <= digest_size < self.UNKNOWN_LENGTH
+            xof_length = digest_size
+            self.digest_size = digest_size
+        self.xof_length = xof_length
+        self.salt       = salt
+        self.person     = person
+        self.root = BLAKE2b(data, digest_size=BLAKE2b.OUTBYTES, key=key,
+                            salt=salt, person=person, xof_length=xof_length)
+        self.h0         = None   # root hash, set when output starts
+        self.position   = 0      # read() position in the output
+    
+    def update(self, data):
+        assert self.h0 is None, 'cannot update after output has started'
+        self.root.update(data)
+    
+    def _start_output(self):
+        if self.h0 is None:
+            self.h0 = self.root.digest()
+        return self.h0
+    
+    def _block_count(self):
+        if self.xof_length == self.UNKNOWN_LENGTH:
+            return 1 << 32
+        return -(-self.xof_length // BLAKE2b.OUTBYTES)
+    
+    def output_block(self, i):
+        """
+        Return output block i (64 bytes, fewer for the last block), without
+        computing the blocks before it. Ends the input.
+        """
+        assert 0 <= i < self._block_count()
+        return _xof_block(self._start_output(), i, self.xof_length,
+                          self.salt, self.person)
+    
+    def output_blocks(self, start, count, executor=None):
+        """
+        Return count consecutive output blocks from block start, joined.
+        With a concurrent.futures executor the blocks are computed in it;
+        a process pool gets them in chunks of 16 blocks per task.
+        """
+        assert 0 <= start and start + count <= self._block_count()
+        h0 = self._start_output()
+        indices = range(start, start + count)
+        if executor is None:
+            blocks = [_xof_block(h0, i, self.xof_length, self.salt, self.person)
+                      for i in indices]
+        else:
+            n = len(indices)
+            blocks = executor.map(_xof_block, [h0]*n, indices,
+                                  [self.xof_length]*n, [self.salt]*n,
+                                  [self.person]*n, chunksize=16)
+        return b''.join(blocks)
+    
+    def read(self, n):
+        """
+        Return the next n bytes of output, continuing where the previous read
+        stopped. Returns fewer bytes at the end of a known-length output.
+        """
+        OUTBYTES = BLAKE2b.OUTBYTES
+        end = self.position + n
+        if self.xof_length != self.UNKNOWN_LENGTH:
+            end = min(end, self.xof_length)
+        if end <= self.position:
+            return b''
+        first = self.position // OUTBYTES
+        last = (end - 1) // OUTBYTES
+        out = self.output_blocks(first, last - first + 1)
+        skip = self.position - first*OUTBYTES
+        self.position = end
+        return out[skip:end - first*OUTBYTES]
+    
+    def digest(self):
+        assert self.xof_length != self.UNKNOWN_LENGTH, 'use read() for unknown-length output'
+        return self.output_blocks(0, self._block_count())
+    
+    def hexdigest(self):
+        return self.digest().hex()
+    
+    def copy(self):
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other.root = self.root.copy()
+        return other
@@ -0,0 +1,880 @@
+from __future__ import annotations
+import errno
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from .blake3_utils import words_from_little_endian_bytes, mask32, add32, rightrotate32
+
+OUT_LEN = 32
+KEY_LEN = 32
+BLOCK_LEN = 64
+CHUNK_LEN = 1024
+
+# Blake3 table3: admissible values for input d in compression function
+CHUNK_START = 1 << 0
+CHUNK_END = 1 << 1
+PARENT = 1 << 2
+ROOT = 1 << 3
+KEYED_HASH = 1 << 4
+DERIVE_KEY_CONTEXT = 1 << 5
+DERIVE_KEY_MATERIAL = 1 << 6
+
+# Blake3 table1: constants IV used in init of Blake3
+IV = [
+    0x6A09E667, 0xBB67AE85,
+    0x3C6EF372, 0xA54FF53A,
+    0x510E527F, 0x9B05688C,
+    0x1F83D9AB, 0x5BE0CD19,
+]
+
+# Blake3 table2: permutational key schedule for keyed permutation
+MSG_PERMUTATION = [2, 6, 3, 10, 7, 0, 4, 13, 1, 11, 12, 5, 9, 14, 15, 8]
+
+# The mixing function, G, which mixes either a column or a diagonal.
+def g(state: list[int], a: int, b: int, c: int, d: int, mx: int, my: int) -> None:
+    """
+    The mixing function, G, which mixes either a column or a diagonal.
+
+    Args:
+        state (list[int]): the internal state v
+        a (int): the location of a 32-bit word from the internal state
+        b (int): the location of a 32-bit word from the internal state
+        c (int): the location of a 32-bit word from the internal state
+        d (int): the location of a 32-bit word from the internal state
+        mx (int): sigma_r[2i]
+        my (int): sigma_r[2i+1]
+    """
+    state[a] = add32(state[a], add32(state[b], mx))
+    state[d] = rightrotate32(state[d] ^ state[a], 16)
+    state[c] = add32(state[c], state[d])
+    state[b] = rightrotate32(state[b] ^ state[c], 12)
+    state[a] = add32(state[a], add32(state[b], my))
+    state[d] = rightrotate32(state[d] ^ state[a], 8)
+    state[c] = add32(state[c], state[d])
+    state[b] = rightrotate32(state[b] ^ state[c], 7)
+    
+def round(state: list[int], m: list[int]) -> None:
+    # Mix the columns.
+    g(state, 0, 4, 8, 12, m[0], m[1])
+    g(state, 1, 5, 9, 13, m[2], m[3])
+    g(state, 2, 6, 10, 14, m[4], m[5])
+    g(state, 3, 7, 11, 15, m[6], m[7])
+    # Mix the diagonals.
+    g(state, 0, 5, 10, 15, m[8], m[9])
+    g(state, 1, 6, 11, 12, m[10], m[11])
+    g(state, 2, 7, 8, 13, m[12], m[13])
+    g(state, 3, 4, 9, 14, m[14], m[15])
+
+def permute(m: list[int]) -> None:
+    original = list(m)
+    for i in range(16):
+        m[i] = original[MSG_PERMUTATION[i]]
+
+def compress(
+    chaining_value: list[int],
+    block_words: list[int],
+    counter: int,
+    block_len: int,
+    flags: int,
+) -> list[int]:
+    """
+    Works with 32-bit words, used to derive a chaining value from each chunk
+    and parent node in the tree. It initialized it's 16-word internal
+    state v. Applies a 7-round keyed permutation to the state v, keyed by
+    the message m.
+
+    Args:
+        chaining_value (list[int]): 256-bit input chaining value
+        block_words (list[int]): the 512-bit message block
+        counter (int): a 64-bit counterwith t[0] the lower order word and t[1] the higher order words
+        block_len (int): the number of input bytes in the block, b
+        flags (int): a set of domain separation bit flags, d
+
+    Returns:
+        list[int]: _description_
+    """
+    state = [
+        chaining_value[0],
+        chaining_value[1],
+        chaining_value[2],
+        chaining_value[3],
+        chaining_value[4],
+        chaining_value[5],
+        chaining_value[6],
+        chaining_value[7],
+        IV[0],
+        IV[1],
+        IV[2],
+        IV[3],
+        mask32(counter),
+        mask32(counter >> 32),
+        block_len,
+        flags,
+    ]
+
+    assert len(block_words) == 16
+    block = list(block_words)
+
+    round(state, block)  # round 1
+    permute(block)
+    round(state, block)  # round 2
+    permute(block)
+    round(state, block)  # round 3
+    permute(block)
+    round(state, block)  # round 4
+    permute(block)
+    round(state, block)  # round 5
+    permute(block)
+    round(state, block)  # round 6
+    permute(block)
+    round(state, block)  # round 7
+
+    for i in range(8):
+        state[i] ^= state[i + 8]
+        state[i + 8] ^= chaining_value[i]
+
+    return state
+
+# Each chunk or parent node can produce either an 8-word chaining value or, by
+# setting the ROOT flag, any number of final output bytes. The Output struct
+# captures the state just prior to choosing between those two possibilities.
+@dataclass
+class Output:
+    input_chaining_value: list[int]
+    block_words: list[int]
+    counter: int
+    block_len: int
+    flags: int
+
+    def chaining_value(self) -> list[int]:
+        return compress(
+            self.input_chaining_value,
+            self.block_words,
+            self.counter,
+            self.block_len,
+            self.flags,
+        )[:8]
+
+    def root_output_bytes(self, length: int) -> bytes:
+        output_bytes = bytearray()
+        i = 0
+        while i < length:
+            words = compress(
+                self.input_chaining_value,
+                self.block_words,
+                i // 64,
+                self.block_len,
+                self.flags | ROOT,
+            )
+            # The output length might not be a multiple of 4.
+            for word in words:
+                word_bytes = word.to_bytes(4, "little")
+                take = min(len(word_bytes), length - i)
+                output_bytes.extend(word_bytes[:take])
+                i += take
+        return output_bytes
+
+
+@dataclass
+class ChunkState:
+    chaining_value: list[int]
+    chunk_counter: int
+    block: bytearray
+    block_len: int
+    blocks_compressed: int
+    flags: int
+
+    def __init__(self, key_words: list[int], chunk_counter: int, flags: int) -> None:
+        self.chaining_value = key_words
+        self.chunk_counter = chunk_counter
+        self.block = bytearray(BLOCK_LEN)
+        self.block_len = 0
+        self.blocks_compressed = 0
+        self.flags = flags
+
+    def len(self) -> int:
+        return BLOCK_LEN * self.blocks_compressed + self.block_len
+
+    def start_flag(self) -> int:
+        if self.blocks_compressed == 0:
+            return CHUNK_START
+        else:
+            return 0
+
+    def compress_block(self, block: bytes) -> None:
+        block_words = words_from_little_endian_bytes(block)
+        self.chaining_value = compress(
+            self.chaining_value,
+            block_words,
+            self.chunk_counter,
+            BLOCK_LEN,
+            self.flags | self.start_flag(),
+        )[:8]
+        self.blocks_compressed += 1
+
+    def update(self, input_bytes: bytes) -> None:
+        while input_bytes:
+            # If the block buffer is full, compress it and clear it. More
+            # input_bytes is coming, so this compression is not CHUNK_END.
+            if self.block_len == BLOCK_LEN:
+                self.compress_block(self.block)
+                self.block = bytearray(BLOCK_LEN)
+                self.block_len = 0
+
+            # Whole blocks followed by more input are compressed in place,
+            # without a trip through the block buffer.
+            while self.block_len == 0 and len(input_bytes) > BLOCK_LEN:
+                self.compress_block(input_bytes[:BLOCK_LEN])
+                input_bytes = input_bytes[BLOCK_LEN:]
+
+            # Copy input bytes into the block buffer.
+            want = BLOCK_LEN - self.block_len
+            take = min(want, len(input_bytes))
+            self.block[self.block_len : self.block_len + take] = input_bytes[:take]
+            self.block_len += take
+            input_bytes = input_bytes[take:]
+
+    def copy(self) -> ChunkState:
+        other = ChunkState(self.chaining_value, self.chunk_counter, self.flags)
+        other.block = bytearray(self.block)
+        other.block_len = self.block_len
+        other.blocks_compressed = self.blocks_compressed
+        return other
+
+    def output(self) -> Output:
+        block_words = words_from_little_endian_bytes(self.block)
+        return Output(
+            self.chaining_value,
+            block_words,
+            self.chunk_counter,
+            self.block_len,
+            self.flags | self.start_flag() | CHUNK_END,
+        )
+
+def parent_output(
+    left_child_cv: list[int],
+    right_child_cv: list[int],
+    key_words: list[int],
+    flags: int,
+) -> Output:
+    return Output(
+        key_words, left_child_cv + right_child_cv, 0, BLOCK_LEN, PARENT | flags
+    )
+
+def parent_cv(
+    left_child_cv: list[int],
+    right_child_cv: list[int],
+    key_words: list[int],
+    flags: int,
+) -> list[int]:
+    return parent_output(
+        left_child_cv, right_child_cv, key_words, flags
+    ).chaining_value()
+
+
+# An incremental hasher that can accept any number of writes.
+@dataclass
+class Hasher:
+    chunk_state: ChunkState
+    key_words: list[int]
+    cv_stack: list[list[int]]
+    flags: int
+    chunk_offset: int
+
+    # hashlib-style attributes; digest_size is per instance, see _init
+    name = "blake3"
+    block_size = BLOCK_LEN
+
+    def _init(self, key_words: list[int], flags: int, chunk_offset: int = 0) -> None:
+        assert len(key_words) == 8
+        self.chunk_state = ChunkState(key_words, chunk_offset, flags)
+        self.key_words = key_words
+        self.cv_stack = []
+        self.flags = flags
+        self.chunk_offset = chunk_offset
+        self.digest_size = OUT_LEN
+
+    # Construct a new `Hasher` for the regular hash function. Taking the
+    # initial data here lets `hmac` use the class as its digest constructor.
+    def __init__(self, data: bytes = b"") -> None:
+        self._init(IV, 0)
+        if data:
+            self.update(data)
+
+    # Construct a new `Hasher` for the keyed hash function.
+    @classmethod
+    def new_keyed(cls, key: bytes) -> Hasher:
+        keyed_hasher = cls()
+        key_words = words_from_little_endian_bytes(key)
+        keyed_hasher._init(key_words, KEYED_HASH)
+        return keyed_hasher
+
+    # Construct a new `Hasher` for the key derivation function. The context
+    # string should be hardcoded, globally unique, and application-specific.
+    @classmethod
+    def new_derive_key(cls, context: str) -> Hasher:
+        context_hasher = cls()
+        context_hasher._init(IV, DERIVE_KEY_CONTEXT)
+        context_hasher.update(context.encode("utf8"))
+        context_key = context_hasher.finalize(KEY_LEN)
+        context_key_words = words_from_little_endian_bytes(context_key)
+        derive_key_hasher = cls()
+        derive_key_hasher._init(context_key_words, DERIVE_KEY_MATERIAL)
+        return derive_key_hasher
+
+    # Section 5.1.2 of the BLAKE3 spec explains this algorithm in more detail.
+    def add_chunk_chaining_value(self, new_cv: list[int], total_chunks: int) -> None:
+        """
+        Blake-3 Section 5.1.2: Chaining Value Stack .
+        For each completed subtree, this chunk's left child will be the current top
+        entry in the CV stack and its right will be the current value of new_cv.
+        Each left child is popped and merged with new_cv then new_cv is overwritten.
+        After all the merges, new_cv is pushed to the stack and the number of completed
+        subtrees is given by the number of trailing 0-bits in the new total number of chunks       
+
+        Args:
+            new_cv (list[int]): new chunk to add to tree
+            total_chunks (int): number of chunks in tree
+        """
+        while total_chunks & 1 == 0:
+            new_cv = parent_cv(self.cv_stack.pop(), new_cv, self.key_words, self.flags)
+            total_chunks >>= 1
+        self.cv_stack.append(new_cv)
+
+    def update(self, input_bytes: bytes) -> None:
+        """
+        Adds input to the hash state. 
+        If current chunk is complete, finalize it and reset the chunk state. 
+
+        Args:
+            input_bytes (bytes): input to hash, any bytes-like object
+        """
+        # Slicing a memoryview does not copy, so large inputs and reused
+        # readinto() buffers are consumed in place.
+        input_bytes = memoryview(input_bytes).cast("B")
+        while input_bytes:
+            if self.chunk_state.len() == CHUNK_LEN:
+                chunk_cv = self.chunk_state.output().chaining_value()
+                total_chunks = self.chunk_state.chunk_counter + 1
+                # Merge relative to the first chunk so a subtree hashed at an
+                # offset never pops past its own left edge.
+                self.add_chunk_chaining_value(chunk_cv, total_chunks - self.chunk_offset)
+                self.chunk_state = ChunkState(self.key_words, total_chunks, self.flags)
+
+            # Compress input bytes into the current chunk state.
+            want = CHUNK_LEN - self.chunk_state.len()
+            take = min(want, len(input_bytes))
+            self.chunk_state.update(input_bytes[:take])
+            input_bytes = input_bytes[take:]
+
+    def finalize(self, length: int = OUT_LEN) -> bytes:
+        """
+        Finalize the hash and write number of output bytes. Starts with
+        output from current chunk and computes all parent cv's along right
+        edge of the tree until the root output.
+
+        Args:
+            length (int, optional): length of output. Defaults to OUT_LEN.
+
+        Returns:
+            bytes: _description_
+        """
+        return self._final_output().root_output_bytes(length)
+
+    def digest(self) -> bytes:
+        return bytes(self.finalize(self.digest_size))
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def _position(self) -> int:
+        return self.chunk_state.chunk_counter * CHUNK_LEN + self.chunk_state.len()
+
+    def _add_run(self, count: int, read, subtree_cvs, max_chunks: int = 0) -> None:
+        """
+        Adds count bytes, of which the whole chunks are added as subtrees
+        aligned to their own size and pushed straight onto the CV stack.
+        read(start, n) returns n bytes of the run from offset start for the
+        partial chunks at either end; subtree_cvs(pieces) returns the CVs of
+        the subtrees, given as (chunk_counter, chunk_count, start) tuples.
+        max_chunks, if set, caps the size of a subtree.
+        """
+        # Fill the current chunk, which may be the empty first chunk.
+        take = min(count, CHUNK_LEN - self.chunk_state.len())
+        if take:
+            self.chunk_state.update(read(0, take))
+        if take == count:
+            return
+        chunk_cv = self.chunk_state.output().chaining_value()
+        chunk_counter = self.chunk_state.chunk_counter + 1
+        self.add_chunk_chaining_value(chunk_cv, chunk_counter - self.chunk_offset)
+
+        # At least one byte is left for the new chunk state, which must not
+        # be merged before finalize.
+        chunks = (count - take - 1) // CHUNK_LEN
+        pieces = []
+        start = take
+        while chunks:
+            relative = chunk_counter - self.chunk_offset
+            size = 1 << (chunks.bit_length() - 1)
+            if relative:
+                size = min(size, relative & -relative)
+            if max_chunks:
+                size = min(size, max_chunks)
+            pieces.append((chunk_counter, size, start))
+            chunk_counter += size
+            chunks -= size
+            start += size * CHUNK_LEN
+        for (piece_counter, size, _), cv in zip(pieces, subtree_cvs(pieces)):
+            # The stack only holds subtrees larger than size, so merging
+            # works as for a single chunk in units of size chunks.
+            relative = piece_counter - self.chunk_offset
+            self.add_chunk_chaining_value(list(cv), (relative + size) // size)
+        self.chunk_state = ChunkState(self.key_words, chunk_counter, self.flags)
+        self.chunk_state.update(read(start, count - start))
+
+    def update_zeros(self, count: int) -> None:
+        """
+        Adds count zero bytes to the hash state without reading or parsing
+        them. Whole zero chunks are added as aligned subtrees whose CVs come
+        from zero_subtree_cv, so they are pushed straight onto the CV stack.
+
+        Args:
+            count (int): number of zero bytes
+        """
+        key_words = tuple(self.key_words)
+        self._add_run(
+            count,
+            lambda start, n: bytes(n),
+            lambda pieces: [
+                zero_subtree_cv(key_words, self.flags, counter, size) for counter, size, _ in pieces
+            ],
+        )
+
+    def update_subtrees(self, input_bytes: bytes, hash_pieces, max_chunks: int = 0) -> None:
+        """
+        Like update, but the whole chunks of input_bytes are cut into aligned
+        subtrees that hash_pieces hashes, for example in parallel workers.
+
+        Args:
+            input_bytes (bytes): input to hash, any bytes-like object
+            hash_pieces: called with a list of (chunk_counter, view) pairs,
+                returns their non-root CVs in order, as from hash_subtree
+            max_chunks (int, optional): largest subtree in chunks, a power of
+                two; 0 for no limit
+        """
+        input_bytes = memoryview(input_bytes).cast("B")
+        self._add_run(
+            len(input_bytes),
+            lambda start, n: input_bytes[start : start + n],
+            lambda pieces: hash_pieces([
+                (counter, input_bytes[start : start + size * CHUNK_LEN])
+                for counter, size, start in pieces
+            ]),
+            max_chunks,
+        )
+
+    def update_sparse(self, input_bytes: bytes) -> None:
+        """
+        Like update, but runs of whole zero chunks in input_bytes are added
+        with update_zeros.
+
+        Args:
+            input_bytes (bytes): input to hash, any bytes-like object
+        """
+        input_bytes = memoryview(input_bytes).cast("B")
+        head = -self._position() % CHUNK_LEN
+        self.update(input_bytes[:head])
+        input_bytes = input_bytes[head:]
+        start = 0
+        while start < len(input_bytes):
+            zero = _is_zero(input_bytes[start : start + CHUNK_LEN])
+            end = start + CHUNK_LEN
+            while end < len(input_bytes) and _is_zero(input_bytes[end : end + CHUNK_LEN]) == zero:
+                end += CHUNK_LEN
+            end = min(end, len(input_bytes))
+            if zero:
+                self.update_zeros(end - start)
+            else:
+                self.update(input_bytes[start:end])
+            start = end
+
+    def update_sparse_file(self, fileobj, read_size: int = 1 << 20) -> None:
+        """
+        Adds a whole file from its current size. Holes reported by
+        SEEK_DATA/SEEK_HOLE are added with update_zeros without being read,
+        and data extents go through update_sparse.
+
+        Args:
+            fileobj: a binary file object with a file descriptor
+            read_size (int, optional): bytes read at a time. Defaults to 1 MiB.
+        """
+        fd = fileobj.fileno()
+        size = os.fstat(fd).st_size
+        buffer = memoryview(bytearray(read_size))
+        position = 0
+        while position < size:
+            data_start, data_end = _next_data(fd, position, size)
+            self.update_zeros(data_start - position)
+            fileobj.seek(data_start)
+            position = data_start
+            while position < data_end:
+                read = fileobj.readinto(buffer[: min(read_size, data_end - position)])
+                if not read:
+                    raise ValueError("file shrank while it was hashed")
+                self.update_sparse(buffer[:read])
+                position += read
+
+    def copy(self) -> Hasher:
+        other = Hasher.__new__(Hasher)
+        other.__dict__.update(self.__dict__)
+        other.chunk_state = self.chunk_state.copy()
+        other.cv_stack = list(self.cv_stack)
+        return other
+
+    def _final_output(self) -> Output:
+        output = self.chunk_state.output()
+        parent_nodes_remaining = len(self.cv_stack)
+        while parent_nodes_remaining > 0:
+            parent_nodes_remaining -= 1
+            output = parent_output(
+                self.cv_stack[parent_nodes_remaining],
+                output.chaining_value(),
+                self.key_words,
+                self.flags,
+            )
+        return output
+
+
+def new(
+    data: bytes = b"",
+    digest_size: int = OUT_LEN,
+    key: bytes | None = None,
+    derive_key_context: str | None = None,
+) -> Hasher:
+    """
+    hashlib-style constructor used by newhash.new("blake3", ...).
+
+    Args:
+        data (bytes, optional): initial input. Defaults to b"".
+        digest_size (int, optional): number of bytes returned by digest(). Defaults to OUT_LEN.
+        key (bytes, optional): 32-byte key for the keyed hash function
+        derive_key_context (str, optional): context string for the key derivation function
+
+    Returns:
+        Hasher: a hasher in the requested mode
+    """
+    if key is not None and derive_key_context is not None:
+        raise ValueError("key and derive_key_context are mutually exclusive")
+    if key is not None:
+        if len(key) != KEY_LEN:
+            raise ValueError("key must be %d bytes" % KEY_LEN)
+        hasher = Hasher.new_keyed(key)
+    elif derive_key_context is not None:
+        hasher = Hasher.new_derive_key(derive_key_context)
+    else:
+        hasher = Hasher()
+    if digest_size < 1:
+        raise ValueError("digest_size must be positive")
+    hasher.digest_size = digest_size
+    if data:
+        hasher.update(data)
+    return hasher
+
+
+# The "guts" of the tree, for hashing one logical input in pieces on different
+# machines. Each piece is hashed as a non-root subtree at its chunk offset, the
+# subtree CVs are merged with `merge_subtrees`, and `finalize_root` produces
+# the output. Keyed and derive-key modes take `key_words` and `flags` from a
+# Hasher built with `new_keyed` or `new_derive_key`.
+@dataclass
+class Subtree:
+    chaining_value: list[int]
+    chunk_offset: int
+    length: int
+
+    def chunk_count(self) -> int:
+        return -(-self.length // CHUNK_LEN)
+
+    def is_complete(self) -> bool:
+        """
+        A complete subtree holds a power-of-two number of full chunks and is
+        the only kind that may appear as a left child.
+        """
+        count = self.chunk_count()
+        return self.length == count * CHUNK_LEN and count & (count - 1) == 0
+
+
+def max_subtree_chunks(chunk_offset: int) -> int:
+    """
+    Largest number of chunks a subtree starting at chunk_offset may span, or 0
+    when the offset is 0 and any size is allowed.
+    """
+    return chunk_offset & -chunk_offset
+
+
+def hash_subtree(
+    input_bytes: bytes,
+    chunk_offset: int,
+    key_words: list[int] = IV,
+    flags: int = 0,
+) -> Subtree:
+    """
+    Hash a byte range that starts at chunk chunk_offset of a larger input into
+    a non-root subtree chaining value.
+
+    Args:
+        input_bytes (bytes): the bytes of the range, at least one byte
+        chunk_offset (int): index of the range's first chunk in the whole input
+        key_words (list[int], optional): key words of the hashing mode. Defaults to IV.
+        flags (int, optional): mode flags of the hashing mode. Defaults to 0.
+
+    Raises:
+        ValueError: if the range is empty or not aligned to its own size
+
+    Returns:
+        Subtree: the subtree CV together with its position and length
+    """
+    if not input_bytes:
+        raise ValueError("a subtree must contain at least one byte")
+    if chunk_offset < 0:
+        raise ValueError("chunk_offset must be non-negative")
+    chunk_count = -(-len(input_bytes) // CHUNK_LEN)
+    max_chunks = max_subtree_chunks(chunk_offset)
+    if max_chunks and chunk_count > max_chunks:
+        raise ValueError(
+            "a subtree at chunk %d may span at most %d chunks, got %d"
+            % (chunk_offset, max_chunks, chunk_count)
+        )
+    hasher = Hasher()
+    hasher._init(key_words, flags, chunk_offset)
+    hasher.update(input_bytes)
+    return Subtree(
+        hasher._final_output().chaining_value(), chunk_offset, len(input_bytes)
+    )
+
+
+def _check_siblings(left: Subtree, right: Subtree) -> None:
+    if not left.is_complete():
+        raise ValueError("left subtree must be a power-of-two number of full chunks")
+    if right.chunk_offset != left.chunk_offset + left.chunk_count():
+        raise ValueError("right subtree must start where the left subtree ends")
+    if right.chunk_count() > left.chunk_count():
+        raise ValueError("right subtree may not be larger than the left subtree")
+    if left.chunk_offset % (2 * left.chunk_count()) != 0:
+        raise ValueError("subtrees are not aligned to a parent node")
+
+
+def merge_subtrees(
+    left: Subtree,
+    right: Subtree,
+    key_words: list[int] = IV,
+    flags: int = 0,
+) -> Subtree:
+    """
+    Merge two sibling subtrees into the non-root subtree of their parent node.
+
+    Args:
+        left (Subtree): complete subtree on the left
+        right (Subtree): subtree that directly follows left, no larger than it
+        key_words (list[int], optional): key words of the hashing mode. Defaults to IV.
+        flags (int, optional): mode flags of the hashing mode. Defaults to 0.
+
+    Raises:
+        ValueError: if the two subtrees are not siblings in the BLAKE3 tree
+
+    Returns:
+        Subtree: the parent subtree
+    """
+    _check_siblings(left, right)
+    return Subtree(
+        parent_cv(left.chaining_value, right.chaining_value, key_words, flags),
+        left.chunk_offset,
+        left.length + right.length,
+    )
+
+
+def finalize_root(
+    subtrees: list[Subtree],
+    length: int = OUT_LEN,
+    key_words: list[int] = IV,
+    flags: int = 0,
+) -> bytes:
+    """
+    Finalize the root output from the ordered subtrees that cover the whole
+    input. Merges them like the CV stack of Hasher: equal complete subtrees as
+    they arrive, then the right edge of the tree from the end.
+
+    Args:
+        subtrees (list[Subtree]): contiguous subtrees starting at chunk 0
+        length (int, optional): length of output. Defaults to OUT_LEN.
+        key_words (list[int], optional): key words of the hashing mode. Defaults to IV.
+        flags (int, optional): mode flags of the hashing mode. Defaults to 0.
+
+    Raises:
+        ValueError: if the subtrees do not form a legal tree of at least two chunks
+
+    Returns:
+        bytes: the root output bytes
+    """
+    if not subtrees or subtrees[0].chunk_offset != 0:
+        raise ValueError("subtrees must start at chunk 0")
+    if len(subtrees) < 2:
+        raise ValueError(
+            "the root needs at least two subtrees; hash a single piece with Hasher"
+        )
+    # As in Hasher.update, the last subtree is held back so that the right
+    # edge of the tree is merged only at the end.
+    stack: list[Subtree] = []
+    for subtree in subtrees[:-1]:
+        while (
+            stack
+            and subtree.is_complete()
+            and stack[-1].chunk_count() == subtree.chunk_count()
+        ):
+            subtree = merge_subtrees(stack.pop(), subtree, key_words, flags)
+        stack.append(subtree)
+    right = subtrees[-1]
+    while len(stack) > 1:
+        right = merge_subtrees(stack.pop(), right, key_words, flags)
+    left = stack.pop()
+    _check_siblings(left, right)
+    return parent_output(
+        left.chaining_value, right.chaining_value, key_words, flags
+    ).root_output_bytes(length)
+
+
+# Runs of zero bytes. The CV of a zero chunk depends on its chunk counter, so
+# no two zero chunks of one input share a CV and each still needs its 16
+# compressions. What update_zeros saves is reading and parsing the zeros:
+# the chunks of an aligned subtree are compressed together as NumPy arrays,
+# their parents are merged level by level, and the resulting CVs are cached
+# by key, flags and position, which helps when the same layout of holes is
+# hashed again.
+
+_ZERO_CHUNK = bytes(CHUNK_LEN)
+
+# chunks of a zero subtree that are compressed in one batch
+ZERO_BATCH_CHUNKS = 1 << 14
+
+
+def _is_zero(view: memoryview) -> bool:
+    return view == _ZERO_CHUNK[: len(view)]
+
+
+def _next_data(fd: int, position: int, size: int) -> tuple[int, int]:
+    """The next data extent at or after position, as (start, end)."""
+    try:
+        start = os.lseek(fd, position, os.SEEK_DATA)
+    except AttributeError:
+        return position, size
+    except OSError as e:
+        # ENXIO: only a hole is left before the end of the file
+        if e.errno == errno.ENXIO:
+            return size, size
+        raise
+    return start, min(os.lseek(fd, start, os.SEEK_HOLE), size)
+
+
+def _compress_many(chaining_value, block_words, counter, block_len: int, flags: int):
+    """
+    compress for n blocks at once, returning only the chaining values.
+    chaining_value and block_words are lists of words, each an int or a
+    uint32 array of shape (n,); block_words is None for all-zero blocks, and
+    counter is a uint64 array of the n counters.
+    """
+    import numpy as np
+
+    n = len(counter)
+    state = [np.array(word, dtype=np.uint32) * np.ones(n, dtype=np.uint32) for word in chaining_value]
+    state += [np.full(n, word, dtype=np.uint32) for word in IV[:4]]
+    state += [
+        (counter & 0xFFFFFFFF).astype(np.uint32),
+        (counter >> 32).astype(np.uint32),
+        np.full(n, block_len, dtype=np.uint32),
+        np.full(n, flags, dtype=np.uint32),
+    ]
+
+    def g_many(a, b, c, d, mx, my):
+        state[a] += state[b]
+        if mx is not None:
+            state[a] += mx
+        x = state[d] ^ state[a]
+        state[d] = (x >> 16) | (x << 16)
+        state[c] += state[d]
+        x = state[b] ^ state[c]
+        state[b] = (x >> 12) | (x << 20)
+        state[a] += state[b]
+        if my is not None:
+            state[a] += my
+        x = state[d] ^ state[a]
+        state[d] = (x >> 8) | (x << 24)
+        state[c] += state[d]
+        x = state[b] ^ state[c]
+        state[b] = (x >> 7) | (x << 25)
+
+    m = list(block_words) if block_words is not None else [None] * 16
+    for r in range(7):
+        if r:
+            m = [m[i] for i in MSG_PERMUTATION]
+        g_many(0, 4, 8, 12, m[0], m[1])
+        g_many(1, 5, 9, 13, m[2], m[3])
+        g_many(2, 6, 10, 14, m[4], m[5])
+        g_many(3, 7, 11, 15, m[6], m[7])
+        g_many(0, 5, 10, 15, m[8], m[9])
+        g_many(1, 6, 11, 12, m[10], m[11])
+        g_many(2, 7, 8, 13, m[12], m[13])
+        g_many(3, 4, 9, 14, m[14], m[15])
+    return [state[i] ^ state[i + 8] for i in range(8)]
+
+
+def _zero_batch_cv(key_words: tuple[int, ...], flags: int, chunk_counter: int, chunk_count: int) -> list[int]:
+    import numpy as np
+
+    counter = np.arange(chunk_counter, chunk_counter + chunk_count, dtype=np.uint64)
+    cv = list(key_words)
+    for i in range(CHUNK_LEN // BLOCK_LEN):
+        block_flags = flags
+        if i == 0:
+            block_flags |= CHUNK_START
+        if i == CHUNK_LEN // BLOCK_LEN - 1:
+            block_flags |= CHUNK_END
+        cv = _compress_many(cv, None, counter, BLOCK_LEN, block_flags)
+    zero_counter = np.zeros(1, dtype=np.uint64)
+    while len(cv[0]) > 1:
+        block_words = [word[0::2] for word in cv] + [word[1::2] for word in cv]
+        cv = _compress_many(
+            key_words, block_words, zero_counter.repeat(len(cv[0]) // 2), BLOCK_LEN, PARENT | flags
+        )
+    return [int(word[0]) for word in cv]
+
+
+@lru_cache(maxsize=1 << 10)
+def zero_subtree_cv(
+    key_words: tuple[int, ...], flags: int, chunk_counter: int, chunk_count: int
+) -> tuple[int, ...]:
+    """
+    The non-root CV of chunk_count zero chunks starting at chunk chunk_counter,
+    as a tuple of words. chunk_count must be a power of two that the subtree
+    is aligned to. Uses NumPy when it is installed.
+
+    Args:
+        key_words (tuple[int, ...]): key words of the hashing mode
+        flags (int): mode flags of the hashing mode
+        chunk_counter (int): index of the first chunk
+        chunk_count (int): number of chunks
+
+    Returns:
+        tuple[int, ...]: the chaining value
+    """
+    if chunk_count > ZERO_BATCH_CHUNKS:
+        half = chunk_count // 2
+        left = zero_subtree_cv(key_words, flags, chunk_counter, half)
+        right = zero_subtree_cv(key_words, flags, chunk_counter + half, half)
+        return tuple(parent_cv(list(left), list(right), list(key_words), flags))
+    try:
+        return tuple(_zero_batch_cv(key_words, flags, chunk_counter, chunk_count))
+    except ImportError:
+        subtree = hash_subtree(bytes(chunk_count * CHUNK_LEN), chunk_counter, list(key_words), flags)
+        return tuple(subtree.chaining_value)
@@ -1,8 +1,9 @@
 from __future__ import annotations
+import struct
 
 def words_from_little_endian_bytes(b: bytes) -> list[int]:
     assert len(b) % 4 == 0
-    return [int.from_bytes(b[i : i + 4], "little") for i in range(0, len(b), 4)]
+    return list(struct.unpack("<%dI" % (len(b) // 4), b))
 
 def mask32(x: int) -> int:
     return x & 0xFFFFFFFF
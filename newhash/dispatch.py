@@ -0,0 +1,405 @@
+"""
+Pick the fastest way to run each hashing job on this machine.
+
+Three strategies are available: "scalar" hashes in the calling process,
+"vectorized" runs a batch of messages through a multi-message NumPy engine
+(keccak.sha3_many, streebog.streebog_many), and "parallel" uses a HashPool,
+splitting large BLAKE3 inputs into subtrees and spreading batches over the
+workers. A one-time calibration measures per-call overheads and throughputs
+of each strategy, derives the crossover points from them, and stores them
+in a JSON profile, so later processes on the same machine start tuned.
+
+    dispatcher = Dispatcher()
+    result = dispatcher.hash(blob, "blake3")
+    result.value, result.strategy
+"""
+from __future__ import annotations
+
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+from . import _check_length, _digest, new
+from .blake3 import CHUNK_LEN, OUT_LEN
+
+PROFILE_VERSION = 1
+
+SCALAR = "scalar"
+VECTORIZED = "vectorized"
+PARALLEL = "parallel"
+
+# BLAKE3 subtree size for parallel jobs, in chunks
+PIECE_CHUNKS = 1 << 10
+
+_SHA3 = frozenset(["sha3_224", "sha3_256", "sha3_384", "sha3_512"])
+_STREEBOG = {"streebog256": 32, "streebog512": 64}
+
+
+def default_profile_path() -> str:
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache, "newhash", "dispatch.json")
+
+
+def _machine() -> dict:
+    return {
+        "cpu_count": os.cpu_count(),
+        "machine": platform.machine(),
+        "python": "%d.%d" % sys.version_info[:2],
+    }
+
+
+def _vector_engine(name: str, params: dict):
+    """The multi-message engine for name, or None."""
+    if params or importlib.util.find_spec("numpy") is None:
+        return None
+    if name in _SHA3:
+        from .keccak import sha3_many
+
+        return lambda messages: sha3_many(messages, name)
+    if name in _STREEBOG:
+        from .streebog import streebog_many
+
+        return lambda messages: streebog_many(messages, _STREEBOG[name])
+    return None
+
+
+def _scalar_hash(name: str, params: dict, data, length: int | None = None) -> bytes:
+    return _digest(new(name, data, **params), length)
+
+
+def _best_time(function, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+@dataclass
+class Dispatched:
+    """The result of a dispatched job and the strategy that computed it."""
+
+    value: object
+    strategy: str
+
+
+class DispatchedHasher:
+    """
+    A hashlib-style hasher from Dispatcher.new. Each update goes to the
+    strategy picked for its size; last_strategy records the latest choice.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, name: str, params: dict) -> None:
+        self._dispatcher = dispatcher
+        self._params = params
+        self.hasher = new(name, **params)
+        self.name = self.hasher.name
+        self.digest_size = self.hasher.digest_size
+        self.block_size = self.hasher.block_size
+        self.last_strategy: str | None = None
+
+    def update(self, data) -> None:
+        self.last_strategy = self._dispatcher._update(self.hasher, self._params, data)
+
+    def digest(self, length: int | None = None) -> bytes:
+        """The digest; length is the output length of extendable-output functions."""
+        return _digest(self.hasher, length)
+
+    def hexdigest(self, length: int | None = None) -> str:
+        return self.digest(length).hex()
+
+    def copy(self) -> DispatchedHasher:
+        other = DispatchedHasher.__new__(DispatchedHasher)
+        other.__dict__.update(self.__dict__)
+        other.hasher = self.hasher.copy()
+        return other
+
+
+class Dispatcher:
+    """
+    Routes update, hash, hash_many and file jobs to the scalar, vectorized or
+    parallel strategy, whichever the profile predicts to be fastest.
+    Algorithms are calibrated the first time they are used, unless the
+    profile already has them.
+
+    Args:
+        profile_path (str, optional): JSON profile location. Defaults to
+            $XDG_CACHE_HOME/newhash/dispatch.json.
+        processes (int, optional): workers of the HashPool used by the
+            parallel strategy. Defaults to os.cpu_count(). A profile measured
+            with another number of processes is discarded.
+    """
+
+    def __init__(self, profile_path: str | None = None, processes: int | None = None) -> None:
+        self.profile_path = profile_path or default_profile_path()
+        self.processes = processes or os.cpu_count() or 1
+        self.profile = self._load()
+        self.counts: Counter = Counter()
+        self._pool = None
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # profile
+
+    def _load(self) -> dict:
+        try:
+            with open(self.profile_path) as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            profile = None
+        if (
+            not isinstance(profile, dict)
+            or profile.get("version") != PROFILE_VERSION
+            or profile.get("machine") != _machine()
+            # crossover points measured for another pool size do not apply
+            or "parallel" in profile and profile["parallel"].get("processes") != self.processes
+        ):
+            profile = {"version": PROFILE_VERSION, "machine": _machine(), "algorithms": {}}
+        return profile
+
+    def _save(self) -> None:
+        directory = os.path.dirname(self.profile_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        # a unique file per writer, so processes calibrating at once do not
+        # replace each other's temporary file
+        fd, temporary = tempfile.mkstemp(prefix=".dispatch-", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.profile, f, indent=2, sort_keys=True)
+            os.replace(temporary, self.profile_path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def _get_pool(self):
+        if self._pool is None:
+            from .pool import HashPool
+
+            self._pool = HashPool(self.processes)
+        return self._pool
+
+    def _calibrate_parallel(self) -> dict:
+        # workers beyond the number of CPUs add overhead but no speed
+        workers = min(self.processes, os.cpu_count() or 1)
+        if workers < 2:
+            parallel = {"workers": 1, "processes": self.processes}
+        else:
+            pool = self._get_pool()
+            pool.submit(b"x").result()  # start the workers
+            overhead = _best_time(lambda: pool.submit(b"x").result(), 5)
+            per_job = _best_time(lambda: pool.map([b"x"] * 64)) / 64
+            parallel = {
+                "workers": workers,
+                "processes": self.processes,
+                "overhead": overhead,
+                "per_job": per_job,
+            }
+        self.profile["parallel"] = parallel
+        return parallel
+
+    def calibrate(self, names=None) -> dict:
+        """
+        Measure the strategies for names (default: every algorithm in the
+        profile, or BLAKE2b and BLAKE3 if it is empty) and save the profile.
+
+        Returns:
+            dict: the profile
+        """
+        if names is None:
+            names = list(self.profile["algorithms"]) or ["blake2b", "blake3"]
+        self.profile.pop("parallel", None)
+        for name in names:
+            self.profile["algorithms"].pop(name, None)
+            self._algorithm(name)
+        return self.profile
+
+    def _algorithm(self, name: str) -> dict:
+        """The profile entry for name, calibrating it if needed."""
+        entry = self.profile["algorithms"].get(name)
+        if entry is not None:
+            return entry
+        parallel = self.profile.get("parallel") or self._calibrate_parallel()
+
+        # extendable-output functions are timed with a digest-sized output
+        length = None if new(name).digest_size else OUT_LEN
+        small = _best_time(lambda: _scalar_hash(name, {}, b"x", length))
+        large = _best_time(lambda: _scalar_hash(name, {}, bytes(8192), length))
+        entry = {"overhead": small, "rate": 8192 / max(large - small, 1e-9)}
+
+        engine = _vector_engine(name, {})
+        if engine is not None:
+            one = _best_time(lambda: engine([bytes(64)]))
+            short = _best_time(lambda: engine([bytes(64)] * 32))
+            long = _best_time(lambda: engine([bytes(1024)] * 32))
+            entry["vector_per_message"] = max(short - one, 0.0) / 31
+            entry["vector_fixed"] = max(one - entry["vector_per_message"], 0.0)
+            entry["vector_per_byte"] = max(long - short, 0.0) / (32 * 960)
+
+        workers = parallel["workers"]
+        if name == "blake3" and workers > 1:
+            # overhead + size / (rate * workers) < size / rate, and at
+            # least two subtrees to share out
+            entry["min_parallel_size"] = max(
+                int(parallel["overhead"] * entry["rate"] * workers / (workers - 1)) + 1,
+                2 * PIECE_CHUNKS * CHUNK_LEN,
+            )
+
+        self.profile["algorithms"][name] = entry
+        try:
+            self._save()
+        except OSError:
+            # an unwritable cache only costs a calibration in the next process
+            pass
+        return entry
+
+    def _estimate(self, entry: dict, parallel: dict, strategy: str, count: int, size: int) -> float:
+        """Predicted seconds for count messages totalling size bytes."""
+        scalar = count * entry["overhead"] + size / entry["rate"]
+        if strategy == SCALAR:
+            return scalar
+        if strategy == VECTORIZED:
+            if "vector_fixed" not in entry:
+                return float("inf")
+            return (
+                entry["vector_fixed"]
+                + count * entry["vector_per_message"]
+                + size * entry["vector_per_byte"]
+            )
+        if parallel["workers"] < 2:
+            return float("inf")
+        return parallel["overhead"] + (count * parallel["per_job"] + scalar) / parallel["workers"]
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # strategies
+
+    def _single_strategy(self, name: str, params: dict, size: int) -> str:
+        # only BLAKE3 can split one input over several workers
+        if name != "blake3":
+            return SCALAR
+        limit = self._algorithm(name).get("min_parallel_size")
+        return PARALLEL if limit is not None and size >= limit else SCALAR
+
+    def _parallel_pieces(self, hasher):
+        pool = self._get_pool()
+
+        def hash_pieces(pieces):
+            futures = [
+                pool.submit_subtree(view, counter, hasher.key_words, hasher.flags)
+                for counter, view in pieces
+            ]
+            return [future.result().chaining_value for future in futures]
+
+        return hash_pieces
+
+    def _update(self, hasher, params: dict, data) -> str:
+        data = memoryview(data).cast("B")
+        strategy = self._single_strategy(hasher.name, params, len(data))
+        if strategy == PARALLEL:
+            hasher.update_subtrees(data, self._parallel_pieces(hasher), PIECE_CHUNKS)
+        else:
+            hasher.update(data)
+        self.counts[strategy] += 1
+        return strategy
+
+    def new(self, name: str = "blake3", **params) -> DispatchedHasher:
+        """A hasher whose updates are dispatched by size."""
+        return DispatchedHasher(self, name, params)
+
+    def hash(self, data, name: str = "blake3", length: int | None = None, **params) -> Dispatched:
+        """
+        Hash one input.
+
+        Args:
+            data (bytes): the input
+            name (str, optional): an algorithm in newhash.algorithms_available. Defaults to "blake3".
+            length (int, optional): output length, required by the
+                extendable-output functions shake_128, shake_256, and
+                blake2xb without a digest_size
+            **params: parameters for newhash.new
+
+        Returns:
+            Dispatched: the digest and the strategy used
+        """
+        hasher = new(name, **params)
+        _check_length(hasher, length)
+        strategy = self._update(hasher, params, data)
+        return Dispatched(_digest(hasher, length), strategy)
+
+    def hash_many(self, messages, name: str = "blake3", length: int | None = None, **params) -> Dispatched:
+        """
+        Hash many independent messages.
+
+        Args:
+            messages (list[bytes]): the inputs
+            name (str, optional): an algorithm in newhash.algorithms_available. Defaults to "blake3".
+            length (int, optional): output length, as for hash
+            **params: parameters for newhash.new
+
+        Returns:
+            Dispatched: the list of digests and the strategy used
+        """
+        messages = list(messages)
+        _check_length(new(name, **params), length)
+        entry = self._algorithm(name)
+        parallel = self.profile.get("parallel") or self._calibrate_parallel()
+        size = sum(len(message) for message in messages)
+        candidates = [SCALAR]
+        if length is None:
+            # HashPool workers and the vector engines return fixed-size digests
+            candidates.append(PARALLEL)
+            if _vector_engine(name, params) is not None:
+                candidates.append(VECTORIZED)
+        strategy = min(
+            candidates,
+            key=lambda s: self._estimate(entry, parallel, s, len(messages), size),
+        )
+        if strategy == VECTORIZED:
+            digests = _vector_engine(name, params)(messages)
+        elif strategy == PARALLEL:
+            digests = self._get_pool().map(messages, name, **params)
+        else:
+            digests = [_scalar_hash(name, params, message, length) for message in messages]
+        self.counts[strategy] += 1
+        return Dispatched(digests, strategy)
+
+    def hash_file(self, path: str, name: str = "blake3", length: int | None = None, **params) -> Dispatched:
+        """
+        Hash a file: in parallel subtrees with HashPool.hash_file when that
+        pays off, otherwise in this process with read-ahead. Arguments as
+        for hash.
+
+        Returns:
+            Dispatched: the digest and the strategy used
+        """
+        _check_length(new(name, **params), length)
+        strategy = self._single_strategy(name, params, os.path.getsize(path))
+        if strategy == PARALLEL:
+            digest = self._get_pool().hash_file(
+                path, name, piece_size=PIECE_CHUNKS * CHUNK_LEN, **params
+            )
+        else:
+            from .readahead import feed
+
+            hasher = new(name, **params)
+            feed(hasher, path)
+            digest = _digest(hasher, length)
+        self.counts[strategy] += 1
+        return Dispatched(digest, strategy)
+
+    def close(self) -> None:
+        """Shut down the HashPool, if the parallel strategy started one."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+
+    def __enter__(self) -> Dispatcher:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,411 @@
+"""
+Keccak sponge, SHA-3 and SHAKE (FIPS 202) over Keccak-f[1600].
+
+The structure follows Keccak/KeccakSponge.java and Keccak/KeccakState.java:
+a KeccakState that absorbs blocks, permutes and is squeezed, and a
+KeccakSponge that holds the bitrate, capacity, domain suffix bits and output
+length and does the padding. keccak_f1600_many and sha3_many run the
+permutation over many independent states at once with NumPy.
+"""
+from __future__ import annotations
+
+import struct
+
+# Keccak-f[1600] lanes are 64 bits and a permutation has 12 + 2*6 = 24 rounds
+WIDTH = 1600
+LANE_LENGTH = 64
+ROUNDS = 24
+MASK64 = 0xFFFFFFFFFFFFFFFF
+
+ROUND_CONSTANTS = [
+    0x0000000000000001, 0x0000000000008082, 0x800000000000808A, 0x8000000080008000,
+    0x000000000000808B, 0x0000000080000001, 0x8000000080008081, 0x8000000000008009,
+    0x000000000000008A, 0x0000000000000088, 0x0000000080008009, 0x000000008000000A,
+    0x000000008000808B, 0x800000000000008B, 0x8000000000008089, 0x8000000000008003,
+    0x8000000000008002, 0x8000000000000080, 0x000000000000800A, 0x800000008000000A,
+    0x8000000080008081, 0x8000000000008080, 0x0000000080000001, 0x8000000080008008,
+]
+
+# rho rotation offsets, ROTATION_CONSTANTS[x][y]
+ROTATION_CONSTANTS = [
+    [ 0, 36,  3, 41, 18],
+    [ 1, 44, 10, 45,  2],
+    [62,  6, 43, 15, 61],
+    [28, 55, 25, 21, 56],
+    [27, 20, 39,  8, 14],
+]
+
+# Lane (x, y) is stored at index x + 5*y, the order in which lanes are
+# absorbed. rho and pi move lane (x, y) to (y, 2x + 3y), rotated by its offset.
+PI_SOURCE = [0] * 25
+PI_ROTATION = [0] * 25
+for _x in range(5):
+    for _y in range(5):
+        PI_SOURCE[_y + 5 * ((2 * _x + 3 * _y) % 5)] = _x + 5 * _y
+        PI_ROTATION[_y + 5 * ((2 * _x + 3 * _y) % 5)] = ROTATION_CONSTANTS[_x][_y]
+del _x, _y
+
+
+def keccak_f1600(lanes: list[int]) -> None:
+    """
+    Apply the 24-round Keccak-f[1600] permutation to 25 lanes in place.
+
+    Args:
+        lanes (list[int]): the state, lane (x, y) at index x + 5*y
+    """
+    a = lanes
+    b = [0] * 25
+    for rc in ROUND_CONSTANTS:
+        # theta: xor each column parity into its neighbours
+        c = [a[x] ^ a[x + 5] ^ a[x + 10] ^ a[x + 15] ^ a[x + 20] for x in range(5)]
+        for x in range(5):
+            c1 = c[(x + 1) % 5]
+            d = c[(x - 1) % 5] ^ (((c1 << 1) | (c1 >> 63)) & MASK64)
+            for y in range(0, 25, 5):
+                a[x + y] ^= d
+        # rho and pi
+        for i in range(25):
+            lane = a[PI_SOURCE[i]]
+            r = PI_ROTATION[i]
+            b[i] = ((lane << r) | (lane >> (64 - r))) & MASK64
+        # chi
+        for y in range(0, 25, 5):
+            b0, b1, b2, b3, b4 = b[y : y + 5]
+            a[y] = b0 ^ (~b1 & b2)
+            a[y + 1] = b1 ^ (~b2 & b3)
+            a[y + 2] = b2 ^ (~b3 & b4)
+            a[y + 3] = b3 ^ (~b4 & b0)
+            a[y + 4] = b4 ^ (~b0 & b1)
+        # iota
+        a[0] ^= rc
+
+
+def keccak_f1600_many(states):
+    """
+    Apply Keccak-f[1600] to many independent states at once. Every step of
+    the round is a NumPy operation over all states, so the interpreter cost is
+    paid once per round instead of once per state. Requires NumPy.
+
+    Args:
+        states (numpy.ndarray): uint64 array of shape (n, 25), lane (x, y) at
+            column x + 5*y; permuted in place
+
+    Returns:
+        numpy.ndarray: states
+    """
+    import numpy as np
+
+    if states.dtype != np.uint64 or states.ndim != 2 or states.shape[1] != 25:
+        raise ValueError("states must be a uint64 array of shape (n, 25)")
+    if not states.flags.c_contiguous:
+        raise ValueError("states must be C-contiguous to be permuted in place")
+    source = np.array(PI_SOURCE)
+    rotation = np.array(PI_ROTATION, dtype=np.uint64)
+    inverse = np.uint64(64) - rotation
+    one, sixty_three = np.uint64(1), np.uint64(63)
+    a = states.reshape(-1, 5, 5)  # [state, y, x]
+    for rc in ROUND_CONSTANTS:
+        c = a[:, 0] ^ a[:, 1] ^ a[:, 2] ^ a[:, 3] ^ a[:, 4]
+        c1 = np.roll(c, -1, axis=1)
+        a ^= (np.roll(c, 1, axis=1) ^ ((c1 << one) | (c1 >> sixty_three)))[:, None, :]
+        lanes = states[:, source]
+        b = ((lanes << rotation) | (lanes >> inverse)).reshape(-1, 5, 5)
+        a[...] = b ^ (~np.roll(b, -1, axis=2) & np.roll(b, -2, axis=2))
+        states[:, 0] ^= np.uint64(rc)
+    return states
+
+
+class KeccakState:
+    """
+    The 25-lane Keccak-f[1600] permutation state, absorbed into and squeezed
+    a whole block of bitrate bits at a time.
+    """
+
+    def __init__(self) -> None:
+        self.lanes = [0] * 25
+
+    def absorb_block(self, block: bytes, offset: int, rate_lanes: int) -> None:
+        lanes = self.lanes
+        for i, word in enumerate(struct.unpack_from("<%dQ" % rate_lanes, block, offset)):
+            lanes[i] ^= word
+        self.permute()
+
+    def permute(self) -> None:
+        keccak_f1600(self.lanes)
+
+    def squeeze_block(self, rate_lanes: int) -> bytes:
+        return struct.pack("<%dQ" % rate_lanes, *self.lanes[:rate_lanes])
+
+    def copy(self) -> KeccakState:
+        other = KeccakState()
+        other.lanes = list(self.lanes)
+        return other
+
+
+def _padding_byte(suffix_bits: str) -> int:
+    # the domain suffix bits followed by the first bit of pad10*1, LSB first
+    pad = 1 << len(suffix_bits)
+    for i, bit in enumerate(suffix_bits):
+        if bit == "1":
+            pad |= 1 << i
+    return pad
+
+
+class KeccakSponge:
+    """
+    Keccak[bitrate, capacity](M || suffix_bits, output_length), absorbed
+    incrementally with update() and squeezed with digest() or squeeze().
+
+    Args:
+        bitrate (int): bits absorbed or squeezed per block, a multiple of 64
+        capacity (int): 1600 - bitrate
+        suffix_bits (str): domain separation bits appended to the message,
+            "01" for SHA-3 and "1111" for SHAKE
+        output_length (int): output length in bits of digest()
+        data (bytes, optional): initial input. Defaults to b"".
+    """
+
+    name = "keccak"
+
+    def __init__(
+        self,
+        bitrate: int,
+        capacity: int,
+        suffix_bits: str,
+        output_length: int,
+        data: bytes = b"",
+    ) -> None:
+        if bitrate < 1 or capacity < 1:
+            raise ValueError("bitrate and capacity must be greater than zero")
+        if bitrate + capacity != WIDTH:
+            raise ValueError("bitrate + capacity must equal %d" % WIDTH)
+        if bitrate % LANE_LENGTH != 0:
+            raise ValueError("bitrate must be a whole number of %d-bit lanes" % LANE_LENGTH)
+        if len(suffix_bits) > 6 or set(suffix_bits) - {"0", "1"}:
+            raise ValueError("suffix_bits must be a bitstring of at most 6 bits")
+        if output_length < 1 or output_length % 8 != 0:
+            raise ValueError("output_length must be a positive number of whole bytes")
+        self.bitrate = bitrate
+        self.capacity = capacity
+        self.suffix_bits = suffix_bits
+        self.output_length = output_length
+        self.digest_size = output_length // 8
+        self.block_size = bitrate // 8
+        self._rate_lanes = bitrate // LANE_LENGTH
+        self._pad = _padding_byte(suffix_bits)
+        self._state = KeccakState()
+        self._buf = b""
+        # squeezing state, see squeeze()
+        self._squeezing = False
+        self._out = b""
+        if data:
+            self.update(data)
+
+    def update(self, data: bytes) -> None:
+        """
+        Absorb data into the sponge. Full blocks are absorbed straight out of
+        the caller's buffer; only a trailing partial block is copied.
+
+        Args:
+            data (bytes): the input to absorb, any bytes-like object
+        """
+        if self._squeezing:
+            raise ValueError("cannot absorb after squeezing has started")
+        rate = self.block_size
+        data = memoryview(data).cast("B")
+        datalen = len(data)
+        dataptr = 0
+        if self._buf:
+            dataptr = rate - len(self._buf)
+            self._buf += data[:dataptr]
+            if len(self._buf) < rate:
+                return
+            self._state.absorb_block(self._buf, 0, self._rate_lanes)
+            self._buf = b""
+        while datalen - dataptr >= rate:
+            self._state.absorb_block(data, dataptr, self._rate_lanes)
+            dataptr += rate
+        if dataptr < datalen:
+            self._buf = bytes(data[dataptr:])
+
+    def _pad_and_absorb(self) -> None:
+        # pad10*1 with the suffix bits folded into the first padding byte
+        block = bytearray(self.block_size)
+        block[: len(self._buf)] = self._buf
+        block[len(self._buf)] ^= self._pad
+        block[-1] ^= 0x80
+        self._state.absorb_block(block, 0, self._rate_lanes)
+        self._buf = b""
+        self._squeezing = True
+
+    def squeeze(self, length: int) -> bytes:
+        """
+        Squeeze the next length bytes of output. The first call pads the
+        message; after that the sponge only produces output, and successive
+        calls continue the same output stream.
+
+        Args:
+            length (int): number of bytes to return
+
+        Returns:
+            bytes: the next length bytes of output
+        """
+        if not self._squeezing:
+            self._pad_and_absorb()
+            self._out = self._state.squeeze_block(self._rate_lanes)
+        out = bytearray()
+        while len(out) < length:
+            if not self._out:
+                self._state.permute()
+                self._out = self._state.squeeze_block(self._rate_lanes)
+            take = min(length - len(out), len(self._out))
+            out += self._out[:take]
+            self._out = self._out[take:]
+        return bytes(out)
+
+    def digest(self) -> bytes:
+        return self.copy().squeeze(self.digest_size)
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def copy(self) -> KeccakSponge:
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        other._state = self._state.copy()
+        return other
+
+    def __repr__(self) -> str:
+        suffix = " || " + self.suffix_bits if self.suffix_bits else ""
+        return "Keccak[%d, %d](M%s, %d)" % (
+            self.bitrate, self.capacity, suffix, self.output_length
+        )
+
+
+class SHA3_224(KeccakSponge):
+    name = "sha3_224"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(1152, 448, "01", 224, data)
+
+
+class SHA3_256(KeccakSponge):
+    name = "sha3_256"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(1088, 512, "01", 256, data)
+
+
+class SHA3_384(KeccakSponge):
+    name = "sha3_384"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(832, 768, "01", 384, data)
+
+
+class SHA3_512(KeccakSponge):
+    name = "sha3_512"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(576, 1024, "01", 512, data)
+
+
+class SHAKE(KeccakSponge):
+    """
+    An extendable-output function. Like hashlib's SHAKE objects, digest()
+    and hexdigest() take the output length; squeeze() streams the output.
+    """
+
+    def __init__(self, bitrate: int, data: bytes = b"") -> None:
+        # output_length only fixes the byte alignment; SHAKE has no digest size
+        super().__init__(bitrate, WIDTH - bitrate, "1111", 8, data)
+        self.digest_size = 0
+
+    def digest(self, length: int) -> bytes:
+        return self.copy().squeeze(length)
+
+    def hexdigest(self, length: int) -> str:
+        return self.digest(length).hex()
+
+
+class SHAKE128(SHAKE):
+    name = "shake_128"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(1344, data)
+
+
+class SHAKE256(SHAKE):
+    name = "shake_256"
+
+    def __init__(self, data: bytes = b"") -> None:
+        super().__init__(1088, data)
+
+
+# name -> (bitrate, default output length in bytes) for sha3_many
+_PARAMETERS = {
+    "sha3_224": (1152, 28),
+    "sha3_256": (1088, 32),
+    "sha3_384": (832, 48),
+    "sha3_512": (576, 64),
+    "shake_128": (1344, None),
+    "shake_256": (1088, None),
+}
+
+
+def sha3_many(messages: list[bytes], name: str = "sha3_256", length: int | None = None) -> list[bytes]:
+    """
+    Hash many independent messages with keccak_f1600_many. Messages that pad
+    to the same number of blocks are absorbed together, so batches of
+    similarly sized records need only a few permutation calls per block.
+    Requires NumPy.
+
+    Args:
+        messages (list[bytes]): the messages to hash
+        name (str, optional): a SHA-3 or SHAKE name. Defaults to "sha3_256".
+        length (int, optional): output length in bytes, required for SHAKE
+
+    Returns:
+        list[bytes]: the digests, in the order of messages
+    """
+    import numpy as np
+
+    try:
+        bitrate, digest_size = _PARAMETERS[name]
+    except KeyError:
+        raise ValueError("unsupported hash type " + name) from None
+    if length is None:
+        if digest_size is None:
+            raise ValueError("length is required for " + name)
+        length = digest_size
+    rate = bitrate // 8
+    rate_lanes = bitrate // LANE_LENGTH
+    pad = _padding_byte("1111" if digest_size is None else "01")
+
+    groups: dict[int, list[int]] = {}
+    for index, message in enumerate(messages):
+        groups.setdefault(len(message) // rate + 1, []).append(index)
+
+    digests: list[bytes] = [b""] * len(messages)
+    for block_count, indices in groups.items():
+        padded = bytearray(len(indices) * block_count * rate)
+        for row, index in enumerate(indices):
+            start = row * block_count * rate
+            message = messages[index]
+            padded[start : start + len(message)] = message
+            padded[start + len(message)] ^= pad
+            padded[start + block_count * rate - 1] ^= 0x80
+        blocks = np.frombuffer(padded, dtype="<u8").reshape(len(indices), block_count, rate_lanes)
+        states = np.zeros((len(indices), 25), dtype=np.uint64)
+        for j in range(block_count):
+            states[:, :rate_lanes] ^= blocks[:, j]
+            keccak_f1600_many(states)
+        output = [states[:, :rate_lanes].astype("<u8").tobytes()]
+        for _ in range(-(-length // rate) - 1):
+            keccak_f1600_many(states)
+            output.append(states[:, :rate_lanes].astype("<u8").tobytes())
+        for row, index in enumerate(indices):
+            digests[index] = b"".join(
+                out[row * rate : (row + 1) * rate] for out in output
+            )[:length]
+    return digests
@@ -0,0 +1,379 @@
+"""
+Compute several digests of the same input in one pass.
+
+MultiHasher reads its input once, in large blocks, into a small ring of
+buffers and hands every block to one consumer per algorithm. Consumers run in
+their own process (the default, so the pure-Python compression functions use
+separate cores) or thread, and read the block in place: processes share the
+ring through shared memory, threads through memoryviews. Each consumer's
+queue holds at most queue_depth blocks, and a buffer is reused only when
+every consumer is done with it. With the process backend the producer
+polls its queues and raises RuntimeError if a consumer process dies.
+
+    digests = hash_file("disk.img", ["blake2b", "blake3"])
+"""
+from __future__ import annotations
+
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+
+from . import algorithms_available, new
+
+# seconds between checks that the consumer processes are still alive
+_POLL = 0.1
+
+
+def _process_consumer(name, params, shm_name, block_size, jobs, acks, results):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    error = None
+    try:
+        hasher = new(name, **params)
+    except Exception as e:
+        error = repr(e)
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        slot, length = job
+        # after an error keep acknowledging slots so the producer never stalls
+        if error is None:
+            start = slot * block_size
+            try:
+                with shm.buf[start : start + length] as view:
+                    hasher.update(view)
+            except Exception as e:
+                error = repr(e)
+        acks.put(slot)
+    shm.close()
+    if error is None:
+        try:
+            results.put((name, hasher.digest(), None))
+        except Exception as e:
+            error = repr(e)
+    if error is not None:
+        results.put((name, None, error))
+
+
+class MultiHasher:
+    """
+    Feed one input to several algorithms at once.
+
+    Args:
+        names (list[str]): algorithms from newhash.algorithms_available, each at most once
+        params (dict, optional): newhash.new parameters per algorithm name
+        block_size (int, optional): size of each ring buffer. Defaults to 1 MiB.
+        queue_depth (int, optional): blocks queued per consumer, and the number
+            of ring buffers. Defaults to 4.
+        backend (str, optional): "process" or "thread". Defaults to "process".
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        params: dict | None = None,
+        block_size: int = 1 << 20,
+        queue_depth: int = 4,
+        backend: str = "process",
+    ) -> None:
+        if len(set(names)) != len(names):
+            raise ValueError("each algorithm may appear only once")
+        for name in names:
+            if name.lower() not in algorithms_available:
+                raise ValueError("unsupported hash type " + name)
+        if backend not in ("process", "thread"):
+            raise ValueError("backend must be 'process' or 'thread'")
+        params = params or {}
+        self.names = list(names)
+        self.block_size = block_size
+        self.backend = backend
+        self._slots = queue_depth
+        self._free = list(range(queue_depth))
+        self._pending = [0] * queue_depth
+        self._lock = threading.Condition()
+        self._results: dict[str, bytes] | None = None
+        self._closed = False
+        self._shm = None
+        self._workers: list = []
+        if backend == "process":
+            self._shm = shared_memory.SharedMemory(create=True, size=queue_depth * block_size)
+            self._buffer = self._shm.buf
+            self._acks = multiprocessing.Queue()
+            self._result_queue = multiprocessing.Queue()
+            self._queues = [multiprocessing.Queue(queue_depth) for _ in names]
+            self._workers = [
+                multiprocessing.Process(
+                    target=_process_consumer,
+                    args=(name, params.get(name, {}), self._shm.name, block_size,
+                          jobs, self._acks, self._result_queue),
+                    daemon=True,
+                )
+                for name, jobs in zip(names, self._queues)
+            ]
+        else:
+            self._buffer = memoryview(bytearray(queue_depth * block_size))
+            self._hashers = {name: new(name, **params.get(name, {})) for name in names}
+            self._errors: dict[str, str] = {}
+            self._queues = [queue.Queue(queue_depth) for _ in names]
+            self._workers = [
+                threading.Thread(target=self._thread_consumer, args=(name, jobs), daemon=True)
+                for name, jobs in zip(names, self._queues)
+            ]
+        for worker in self._workers:
+            worker.start()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # ring buffer bookkeeping
+
+    def _release(self, slot) -> None:
+        with self._lock:
+            self._pending[slot] -= 1
+            if self._pending[slot] == 0:
+                if slot < self._slots:
+                    self._free.append(slot)
+                self._lock.notify_all()
+
+    def _dead_consumer(self, name: str, exitcode: int) -> None:
+        self.close()
+        raise RuntimeError(
+            "the %s consumer process exited unexpectedly (exit code %s)" % (name, exitcode)
+        )
+
+    def _check_workers(self) -> None:
+        # before digests() every consumer is still waiting for jobs
+        for name, worker in zip(self.names, self._workers):
+            if worker.exitcode is not None:
+                self._dead_consumer(name, worker.exitcode)
+
+    def _get(self, source):
+        while True:
+            try:
+                return source.get(timeout=_POLL)
+            except queue.Empty:
+                self._check_workers()
+
+    def _collect_results(self) -> tuple[dict, dict]:
+        # (digests, errors) per algorithm from the consumer processes
+        results: dict[str, bytes] = {}
+        errors: dict[str, str] = {}
+
+        def store(item) -> None:
+            name, digest, error = item
+            results[name] = digest
+            if error:
+                errors[name] = error
+
+        while len(results) < len(self._workers):
+            try:
+                store(self._result_queue.get(timeout=_POLL))
+                continue
+            except queue.Empty:
+                pass
+            exited = {
+                name: worker.exitcode
+                for name, worker in zip(self.names, self._workers)
+                if worker.exitcode is not None
+            }
+            # a consumer may have sent its result and exited since the
+            # timeout, so results are drained before any of them counts as dead
+            try:
+                while True:
+                    store(self._result_queue.get_nowait())
+            except queue.Empty:
+                pass
+            for name, exitcode in exited.items():
+                if name not in results:
+                    self._dead_consumer(name, exitcode)
+        return results, errors
+
+    def _put(self, jobs, item) -> None:
+        if self.backend == "thread":
+            jobs.put(item)
+            return
+        while True:
+            try:
+                return jobs.put(item, timeout=_POLL)
+            except queue.Full:
+                self._check_workers()
+
+    def _acquire(self) -> int:
+        if self.backend == "process":
+            # consumer processes acknowledge slots through the ack queue
+            while not self._free:
+                self._release(self._get(self._acks))
+            return self._free.pop()
+        with self._lock:
+            while not self._free:
+                self._lock.wait()
+            return self._free.pop()
+
+    def _slot_view(self, slot: int, length: int) -> memoryview:
+        start = slot * self.block_size
+        return self._buffer[start : start + length]
+
+    def _dispatch(self, slot, length: int, view=None) -> None:
+        self._pending[slot] = len(self._queues)
+        for jobs in self._queues:
+            if self.backend == "process":
+                self._put(jobs, (slot, length))
+            else:
+                jobs.put((slot, view if view is not None else self._slot_view(slot, length)))
+
+    def _thread_consumer(self, name: str, jobs: queue.Queue) -> None:
+        hasher = self._hashers[name]
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            slot, view = job
+            try:
+                if name not in self._errors:
+                    hasher.update(view)
+            except Exception as e:
+                self._errors[name] = repr(e)
+            self._release(slot)
+
+    def _check_open(self) -> None:
+        if self._results is not None:
+            raise ValueError("digests() has already been called")
+        if self._closed:
+            raise ValueError("MultiHasher is closed")
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+
+    def update(self, data) -> None:
+        """
+        Feed data to every algorithm. With the thread backend the consumers
+        read data in place and update returns once all of them are done with
+        it; with the process backend it is copied into the shared ring.
+
+        Args:
+            data (bytes): the input, any bytes-like object
+        """
+        self._check_open()
+        data = memoryview(data).cast("B")
+        if self.backend == "thread":
+            if data:
+                # a one-off slot that is never returned to the free list
+                with self._lock:
+                    self._pending.append(0)
+                    slot = len(self._pending) - 1
+                self._dispatch(slot, len(data), data)
+                with self._lock:
+                    while self._pending[slot]:
+                        self._lock.wait()
+                    self._pending.pop()
+            return
+        for offset in range(0, len(data), self.block_size):
+            piece = data[offset : offset + self.block_size]
+            slot = self._acquire()
+            self._slot_view(slot, len(piece))[:] = piece
+            self._dispatch(slot, len(piece))
+
+    def update_file(self, fileobj) -> None:
+        """
+        Read a binary file object to its end with readinto, straight into the
+        ring buffers, and feed it to every algorithm.
+
+        Args:
+            fileobj: a file object opened for reading in binary mode
+        """
+        self._check_open()
+        while True:
+            slot = self._acquire()
+            length = fileobj.readinto(self._slot_view(slot, self.block_size))
+            if not length:
+                self._free.append(slot)
+                return
+            self._dispatch(slot, length)
+
+    def digests(self) -> dict[str, bytes]:
+        """
+        Finish all algorithms and return their digests. The MultiHasher cannot
+        be updated afterwards.
+
+        Returns:
+            dict[str, bytes]: digest per algorithm name
+        """
+        if self._results is not None:
+            return dict(self._results)
+        self._check_open()
+        for jobs in self._queues:
+            self._put(jobs, None)
+        if self.backend == "process":
+            results, errors = self._collect_results()
+            for worker in self._workers:
+                worker.join()
+        else:
+            for worker in self._workers:
+                worker.join()
+            errors = self._errors
+            results = {}
+            for name, hasher in self._hashers.items():
+                if name not in errors:
+                    results[name] = hasher.digest()
+        self.close()
+        if errors:
+            raise RuntimeError("hashing failed: %s" % errors)
+        self._results = {name: results[name] for name in self.names}
+        return dict(self._results)
+
+    def hexdigests(self) -> dict[str, str]:
+        return {name: digest.hex() for name, digest in self.digests().items()}
+
+    def close(self) -> None:
+        """
+        Stop the consumers and release the ring buffers. Called by digests();
+        call it to abandon a MultiHasher without computing its digests.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self.backend == "process":
+            for worker in self._workers:
+                if worker.is_alive() and self._results is None:
+                    worker.terminate()
+                worker.join()
+            self._buffer = None
+            if self._shm is not None:
+                self._shm.close()
+                self._shm.unlink()
+        else:
+            for jobs, worker in zip(self._queues, self._workers):
+                if worker.is_alive():
+                    jobs.put(None)
+            for worker in self._workers:
+                worker.join()
+
+    def __del__(self) -> None:
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> MultiHasher:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is not None:
+            self.close()
+        elif self._results is None and not self._closed:
+            self.digests()
+
+
+def hash_file(path: str, names: list[str], **options) -> dict[str, bytes]:
+    """
+    Read the file at path once and return its digest for every algorithm.
+
+    Args:
+        path (str): the file
+        names (list[str]): algorithms from newhash.algorithms_available
+        **options: other MultiHasher arguments
+
+    Returns:
+        dict[str, bytes]: digest per algorithm name
+    """
+    with open(path, "rb", buffering=0) as f, MultiHasher(names, **options) as hasher:
+        hasher.update_file(f)
+        return hasher.digests()
@@ -0,0 +1,277 @@
+"""
+A persistent process pool for hashing large buffers without pickling them.
+
+Input handed to HashPool.submit is copied once into a shared-memory arena
+that every worker attaches to when it starts; the job sent to the worker is
+only the offset and length of the data in the arena. Files are not copied at
+all: workers memory-map them and hash the requested range. The arena size
+bounds the memory in flight, and submit blocks while it is full.
+
+    with HashPool(processes=4) as pool:
+        futures = [pool.submit(blob, "blake2b", digest_size=32) for blob in blobs]
+        digests = [future.result() for future in futures]
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from . import new
+from .blake3 import CHUNK_LEN, IV, Subtree, finalize_root, hash_subtree
+
+# arena allocations are rounded up to this many bytes
+ALIGNMENT = 64
+
+# the worker's view of the parent's arena, set by _attach
+_arena: shared_memory.SharedMemory | None = None
+
+
+def _attach(arena_name: str) -> None:
+    global _arena
+    _arena = shared_memory.SharedMemory(name=arena_name)
+
+
+def _hash_view(view: memoryview, job: tuple):
+    kind, name, params = job
+    if kind == "subtree":
+        chunk_offset, key_words, flags = params
+        return hash_subtree(view, chunk_offset, key_words, flags)
+    hasher = new(name, **params)
+    hasher.update(view)
+    return hasher.digest()
+
+
+def _run_arena_job(offset: int, length: int, job: tuple):
+    with _arena.buf[offset : offset + length] as view:
+        return _hash_view(view, job)
+
+
+def _run_file_job(path: str, offset: int, length: int, job: tuple):
+    if length == 0:
+        return _hash_view(memoryview(b""), job)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped)[offset : offset + length] as view:
+            return _hash_view(view, job)
+
+
+class _Arena:
+    """
+    First-fit allocator over one shared-memory segment. allocate blocks until
+    a large enough range has been released.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.size = size
+        self.free = [(0, size)]  # sorted, non-adjacent (offset, length) ranges
+        self.cond = threading.Condition()
+
+    def allocate(self, length: int) -> int:
+        length = -(-length // ALIGNMENT) * ALIGNMENT
+        if length > self.size:
+            raise ValueError(
+                "%d bytes do not fit in the %d-byte arena; use submit_file or a larger arena"
+                % (length, self.size)
+            )
+        with self.cond:
+            while True:
+                for i, (start, free_length) in enumerate(self.free):
+                    if free_length >= length:
+                        if free_length == length:
+                            del self.free[i]
+                        else:
+                            self.free[i] = (start + length, free_length - length)
+                        return start
+                self.cond.wait()
+
+    def release(self, offset: int, length: int) -> None:
+        length = -(-length // ALIGNMENT) * ALIGNMENT
+        with self.cond:
+            free = self.free
+            i = 0
+            while i < len(free) and free[i][0] < offset:
+                i += 1
+            free.insert(i, (offset, length))
+            # coalesce with the following and the preceding range
+            if i + 1 < len(free) and offset + length == free[i + 1][0]:
+                free[i] = (offset, length + free[i + 1][1])
+                del free[i + 1]
+            if i > 0 and free[i - 1][0] + free[i - 1][1] == offset:
+                free[i - 1] = (free[i - 1][0], free[i - 1][1] + free[i][1])
+                del free[i]
+            self.cond.notify_all()
+
+    def close(self) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+class Buffer:
+    """
+    A writable range of the pool's arena, returned by HashPool.reserve. Fill
+    view (for example with readinto) and pass the buffer to submit, which
+    then hashes it without any copy and releases it when the job is done.
+    """
+
+    def __init__(self, arena: _Arena, offset: int, length: int) -> None:
+        self._arena = arena
+        self.offset = offset
+        self.length = length
+        self.view = arena.shm.buf[offset : offset + length]
+
+    def release(self) -> None:
+        """Give the range back to the arena without hashing it."""
+        if self.view is not None:
+            self.view.release()
+            self.view = None
+            if self.length:
+                self._arena.release(self.offset, self.length)
+
+
+class HashPool:
+    """
+    Worker processes that stay alive between jobs and read their input from
+    shared memory or memory-mapped files.
+
+    Args:
+        processes (int, optional): number of workers. Defaults to os.cpu_count().
+        arena_size (int, optional): bytes of shared memory for submitted data,
+            which bounds the input in flight. Defaults to 256 MiB.
+    """
+
+    def __init__(self, processes: int | None = None, arena_size: int = 256 << 20) -> None:
+        self._arena = _Arena(arena_size)
+        self._executor = ProcessPoolExecutor(
+            max_workers=processes, initializer=_attach, initargs=(self._arena.shm.name,)
+        )
+
+    def reserve(self, length: int) -> Buffer:
+        """
+        Reserve length bytes of the arena, blocking while it is full.
+
+        Args:
+            length (int): size of the buffer
+
+        Returns:
+            Buffer: the reserved range, to be filled and passed to submit
+        """
+        offset = self._arena.allocate(length) if length else 0
+        return Buffer(self._arena, offset, length)
+
+    def _submit_arena(self, data, job: tuple) -> Future:
+        if isinstance(data, Buffer):
+            buffer = data
+        else:
+            data = memoryview(data).cast("B")
+            buffer = self.reserve(len(data))
+        try:
+            if buffer is not data:
+                buffer.view[:] = data
+            future = self._executor.submit(_run_arena_job, buffer.offset, buffer.length, job)
+        except BaseException:
+            # a job that never started must not keep its range
+            buffer.release()
+            raise
+        future.add_done_callback(lambda _: buffer.release())
+        return future
+
+    def submit(self, data, name: str = "blake3", **params) -> Future:
+        """
+        Hash data in a worker. data is copied once into the arena, or not at
+        all if it is a Buffer from reserve.
+
+        Args:
+            data (bytes | Buffer): the input
+            name (str, optional): an algorithm in newhash.algorithms_available. Defaults to "blake3".
+            **params: parameters for newhash.new
+
+        Returns:
+            Future: resolves to the digest
+        """
+        return self._submit_arena(data, ("digest", name, params))
+
+    def submit_subtree(
+        self, data, chunk_offset: int, key_words: list[int] = IV, flags: int = 0
+    ) -> Future:
+        """
+        Hash data as the BLAKE3 subtree starting at chunk chunk_offset.
+
+        Returns:
+            Future: resolves to a blake3.Subtree
+        """
+        return self._submit_arena(data, ("subtree", "blake3", (chunk_offset, key_words, flags)))
+
+    def submit_file(
+        self, path: str, offset: int = 0, length: int | None = None, name: str = "blake3", **params
+    ) -> Future:
+        """
+        Hash a range of a file in a worker, which memory-maps the file itself.
+
+        Args:
+            path (str): the file
+            offset (int, optional): first byte of the range. Defaults to 0.
+            length (int, optional): length of the range. Defaults to the rest of the file.
+            name (str, optional): an algorithm in newhash.algorithms_available. Defaults to "blake3".
+            **params: parameters for newhash.new
+
+        Returns:
+            Future: resolves to the digest
+        """
+        if length is None:
+            length = os.path.getsize(path) - offset
+        return self._executor.submit(_run_file_job, path, offset, length, ("digest", name, params))
+
+    def hash_file(self, path: str, name: str = "blake3", piece_size: int = 4 << 20, **params) -> bytes:
+        """
+        Hash a whole file. For BLAKE3 the file is split into piece_size
+        subtrees hashed by all workers in parallel and joined with
+        blake3.finalize_root; other algorithms hash the file in one worker.
+
+        Args:
+            path (str): the file
+            name (str, optional): an algorithm in newhash.algorithms_available. Defaults to "blake3".
+            piece_size (int, optional): BLAKE3 subtree size, a power-of-two
+                multiple of blake3.CHUNK_LEN. Defaults to 4 MiB.
+            **params: parameters for newhash.new
+
+        Returns:
+            bytes: the digest
+        """
+        size = os.path.getsize(path)
+        if name != "blake3" or size <= piece_size:
+            return self.submit_file(path, 0, size, name, **params).result()
+        chunks = piece_size // CHUNK_LEN
+        if piece_size % CHUNK_LEN or chunks & (chunks - 1):
+            raise ValueError("piece_size must be a power-of-two multiple of %d" % CHUNK_LEN)
+        mode = new(name, **params)
+        futures = [
+            self._executor.submit(
+                _run_file_job,
+                path,
+                offset,
+                min(piece_size, size - offset),
+                ("subtree", name, (offset // CHUNK_LEN, mode.key_words, mode.flags)),
+            )
+            for offset in range(0, size, piece_size)
+        ]
+        subtrees: list[Subtree] = [future.result() for future in futures]
+        return bytes(finalize_root(subtrees, mode.digest_size, mode.key_words, mode.flags))
+
+    def map(self, blobs, name: str = "blake3", **params) -> list[bytes]:
+        """Hash every blob in blobs and return the digests in order."""
+        futures = [self.submit(blob, name, **params) for blob in blobs]
+        return [future.result() for future in futures]
+
+    def close(self) -> None:
+        """Wait for pending jobs, stop the workers and free the arena."""
+        self._executor.shutdown(wait=True)
+        self._arena.close()
+
+    def __enter__(self) -> HashPool:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
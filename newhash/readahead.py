@@ -0,0 +1,167 @@
+"""
+Read-ahead for file hashing: disk reads overlap with compression.
+
+A background thread reads the file with readinto into a small ring of
+preallocated buffers, while the caller consumes the buffers already filled
+through memoryviews. The reader only waits when every buffer is still held
+by the consumer, and the consumer only waits when the reader has fallen
+behind; both kinds of stall are counted, so the tunables can be checked
+against the storage in use.
+
+    stats = feed(newhash.new("blake3"), "disk.img", buffer_count=4, buffer_size=1 << 20)
+"""
+from __future__ import annotations
+
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass
+class ReadAheadStats:
+    """
+    Counters of a ReadAhead. Reader stalls mean the consumer is the
+    bottleneck; consumer stalls mean the storage is.
+    """
+
+    bytes_read: int = 0
+    buffers_filled: int = 0
+    reader_stalls: int = 0
+    reader_stall_time: float = 0.0
+    consumer_stalls: int = 0
+    consumer_stall_time: float = 0.0
+
+
+def _get(source: queue.Queue):
+    # returns (item, seconds waited, or None if the item was ready)
+    try:
+        return source.get_nowait(), None
+    except queue.Empty:
+        start = time.perf_counter()
+        item = source.get()
+        return item, time.perf_counter() - start
+
+
+class ReadAhead:
+    """
+    Iterate over a binary file as memoryviews of buffers filled ahead of time
+    by a background thread. Each view is valid until the next one is
+    requested, when its buffer goes back to the reader. A ReadAhead can be
+    iterated only once.
+
+    Args:
+        fileobj: a binary file object supporting readinto
+        buffer_count (int, optional): buffers in the ring; the reader can be
+            buffer_count - 1 buffers ahead. Defaults to 4.
+        buffer_size (int, optional): bytes per buffer. Defaults to 1 MiB.
+        fadvise (bool, optional): tell the kernel the file is read
+            sequentially with posix_fadvise, where available. Defaults to True.
+    """
+
+    def __init__(
+        self, fileobj, buffer_count: int = 4, buffer_size: int = 1 << 20, fadvise: bool = True
+    ) -> None:
+        if buffer_count < 2:
+            raise ValueError("buffer_count must be at least 2")
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be positive")
+        self.fileobj = fileobj
+        self.stats = ReadAheadStats()
+        self._buffers = [memoryview(bytearray(buffer_size)) for _ in range(buffer_count)]
+        self._free: queue.Queue = queue.Queue()
+        self._filled: queue.Queue = queue.Queue()
+        self._closed = False
+        self._iterated = False
+        for index in range(buffer_count):
+            self._free.put(index)
+        if fadvise and hasattr(os, "posix_fadvise"):
+            try:
+                fd = fileobj.fileno()
+                os.posix_fadvise(fd, fileobj.tell(), 0, os.POSIX_FADV_SEQUENTIAL)
+            except (AttributeError, OSError, ValueError):
+                pass
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+
+    def _read(self) -> None:
+        stats = self.stats
+        try:
+            while True:
+                index, waited = _get(self._free)
+                if index is None or self._closed:
+                    return
+                if waited is not None:
+                    stats.reader_stalls += 1
+                    stats.reader_stall_time += waited
+                length = self.fileobj.readinto(self._buffers[index])
+                if not length:
+                    self._filled.put(None)
+                    return
+                stats.bytes_read += length
+                stats.buffers_filled += 1
+                self._filled.put((index, length))
+        except BaseException as e:
+            self._filled.put(e)
+
+    def __iter__(self):
+        if self._closed:
+            raise ValueError("ReadAhead is closed")
+        if self._iterated:
+            raise ValueError("ReadAhead can only be iterated once")
+        self._iterated = True
+        return self._iterate()
+
+    def _iterate(self):
+        stats = self.stats
+        try:
+            while True:
+                item, waited = _get(self._filled)
+                if waited is not None:
+                    stats.consumer_stalls += 1
+                    stats.consumer_stall_time += waited
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                index, length = item
+                yield self._buffers[index][:length]
+                self._free.put(index)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """Stop the reader thread. Called when iteration ends."""
+        self._closed = True
+        # wakes the reader if it is waiting for a free buffer
+        self._free.put(None)
+        self._thread.join()
+
+    def __enter__(self) -> ReadAhead:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def feed(hasher, source, buffer_count: int = 4, buffer_size: int = 1 << 20, fadvise: bool = True) -> ReadAheadStats:
+    """
+    Update any hasher (BLAKE2b, blake3.Hasher, ...) with a whole file read
+    through ReadAhead.
+
+    Args:
+        hasher: an object with an update method accepting memoryviews
+        source (str | file object): a path, or a binary file object to read to its end
+        buffer_count, buffer_size, fadvise: as for ReadAhead
+
+    Returns:
+        ReadAheadStats: the reader's counters
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, "rb", buffering=0) as f:
+            return feed(hasher, f, buffer_count, buffer_size, fadvise)
+    reader = ReadAhead(source, buffer_count, buffer_size, fadvise)
+    for view in reader:
+        hasher.update(view)
+    return reader.stats
@@ -0,0 +1,703 @@
+"""
+A local hashing service: an asyncio server on a Unix socket and a pooled
+client, so many processes can share one set of warm hashing workers.
+
+Small requests that arrive close together are coalesced into batches and
+run in a process pool. SHA-3 and Streebog batches use the multi-message
+engines keccak.sha3_many and streebog.streebog_many. Large requests are
+streamed in chunks and hashed in the same pool while further chunks arrive:
+BLAKE3 chunks are cut into subtrees that the workers hash side by side, and
+for the other algorithms the hasher state travels to a worker with each
+chunk and back. Every client process may have at most max_in_flight
+requests in progress, and the server keeps latency and throughput metrics.
+
+Wire format: each message is a frame of two big-endian 32-bit lengths, a
+JSON header and a binary payload. A request with "chunked": true has an
+empty payload and is followed by chunks, each a 32-bit length and the
+data, ending with a zero length.
+
+    python -m newhash.service /tmp/newhash.sock
+
+    async with Client("/tmp/newhash.sock") as client:
+        digest = await client.hash(b"hello", "blake2b", digest_size=32)
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import errno
+import functools
+import hmac
+import itertools
+import json
+import os
+import socket
+import stat
+import struct
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from . import _check_length, _digest, new
+from .blake3 import Hasher as Blake3Hasher, hash_subtree
+
+_FRAME = struct.Struct(">II")
+_CHUNK = struct.Struct(">I")
+
+# algorithms whose MAC is their own keyed mode rather than HMAC
+_KEYED = frozenset(["blake2b", "blake2xb", "blake3"])
+
+# largest BLAKE3 subtree of a streamed chunk, in chunks of 1 KiB
+_STREAM_PIECE_CHUNKS = 256
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> tuple[dict, bytes]:
+    header_len, payload_len = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+    header = json.loads(await reader.readexactly(header_len))
+    payload = await reader.readexactly(payload_len) if payload_len else b""
+    return header, payload
+
+
+def _frame(header: dict, payload: bytes = b"") -> bytes:
+    encoded = json.dumps(header).encode()
+    return _FRAME.pack(len(encoded), len(payload)) + encoded + payload
+
+
+def _new_hasher(op: str, name: str, params: dict, key: bytes | None, context: str | None):
+    if op == "hash":
+        return new(name, **params)
+    if op == "mac":
+        if key is None:
+            raise ValueError("mac needs a key")
+        if name in _KEYED:
+            return new(name, key=key, **params)
+        # a partial rather than a lambda keeps the HMAC object picklable
+        return hmac.new(key, digestmod=functools.partial(new, name, **params))
+    if op == "derive_key":
+        if context is None:
+            raise ValueError("derive_key needs a context")
+        return new("blake3", derive_key_context=context, **params)
+    raise ValueError("unknown operation " + op)
+
+
+def _job(header: dict) -> tuple:
+    key = header.get("key")
+    return (
+        header["op"],
+        header.get("name", "blake3"),
+        header.get("params", {}),
+        bytes.fromhex(key) if key is not None else None,
+        header.get("context"),
+        header.get("length"),
+    )
+
+
+def _update(hasher, chunk: bytes):
+    # one step of a streamed request in a worker; the state goes back
+    hasher.update(chunk)
+    return hasher
+
+
+def _vectorized(name: str, messages: list[bytes]) -> list[bytes] | None:
+    try:
+        if name.startswith("sha3_"):
+            from .keccak import sha3_many
+
+            return sha3_many(messages, name)
+        if name in ("streebog256", "streebog512"):
+            from .streebog import streebog_many
+
+            return streebog_many(messages, 32 if name == "streebog256" else 64)
+    except ImportError:
+        pass
+    return None
+
+
+def _run_batch(jobs: list[tuple]) -> list[tuple[bool, object]]:
+    """
+    Run a batch of (op, name, params, key, context, length, data) jobs in a
+    worker. Plain hashes of one vectorizable algorithm go through its
+    multi-message engine. Returns (True, digest) or (False, error message)
+    per job.
+    """
+    results: list = [None] * len(jobs)
+    groups: dict[str, list[int]] = {}
+    for index, (op, name, params, _, _, length, _) in enumerate(jobs):
+        if op == "hash" and not params and length is None:
+            groups.setdefault(name, []).append(index)
+    for name, indices in groups.items():
+        if len(indices) > 1:
+            digests = _vectorized(name, [jobs[i][6] for i in indices])
+            if digests is not None:
+                for i, digest in zip(indices, digests):
+                    results[i] = (True, digest)
+    for index, (op, name, params, key, context, length, data) in enumerate(jobs):
+        if results[index] is None:
+            try:
+                hasher = _new_hasher(op, name, params, key, context)
+                hasher.update(data)
+                results[index] = (True, _digest(hasher, length))
+            except Exception as e:
+                results[index] = (False, "%s: %s" % (type(e).__name__, e))
+    return results
+
+
+class _Metrics:
+    def __init__(self, window: int = 10000) -> None:
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.bytes = 0
+        self.batches = 0
+        self.batched_requests = 0
+        self.streamed_requests = 0
+        self.latencies: deque = deque(maxlen=window)
+
+    def record(self, size: int, seconds: float, ok: bool) -> None:
+        self.requests += 1
+        self.bytes += size
+        self.errors += not ok
+        self.latencies.append(seconds)
+
+    def snapshot(self) -> dict:
+        uptime = time.monotonic() - self.started
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "bytes": self.bytes,
+            "requests_per_s": self.requests / uptime,
+            "bytes_per_s": self.bytes / uptime,
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+            "streamed_requests": self.streamed_requests,
+            "latency_ms": {
+                "p50": percentile(0.5),
+                "p90": percentile(0.9),
+                "p99": percentile(0.99),
+                "max": latencies[-1] * 1000 if latencies else 0.0,
+            },
+        }
+
+
+class HashService:
+    """
+    The server side.
+
+    Args:
+        path (str): Unix socket path
+        processes (int, optional): hashing worker processes. Defaults to os.cpu_count().
+        max_batch (int, optional): most small requests in one batch. Defaults to 64.
+        batch_delay (float, optional): seconds a small request may wait for
+            others to join its batch. Defaults to 0.001.
+        small_limit (int, optional): largest payload that is batched; larger
+            ones run on their own. Defaults to 64 KiB.
+        max_in_flight (int, optional): requests in progress per client
+            process. Defaults to 16.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        processes: int | None = None,
+        max_batch: int = 64,
+        batch_delay: float = 0.001,
+        small_limit: int = 64 << 10,
+        max_in_flight: int = 16,
+    ) -> None:
+        self.path = path
+        self.max_batch = max_batch
+        self.batch_delay = batch_delay
+        self.small_limit = small_limit
+        self.max_in_flight = max_in_flight
+        self.metrics = _Metrics()
+        self._executor = ProcessPoolExecutor(max_workers=processes)
+        self._server: asyncio.AbstractServer | None = None
+        self._pending: list[tuple[tuple, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        # client key -> [semaphore, open connections]
+        self._limits: dict = {}
+        self._connections: dict = {}  # handler task -> writer
+
+    def _remove_stale_socket(self) -> None:
+        # only a socket left behind by a service that is gone is removed
+        try:
+            mode = os.stat(self.path).st_mode
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(mode):
+            raise FileExistsError(errno.EEXIST, "not a socket", self.path)
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+        except ConnectionRefusedError:
+            os.unlink(self.path)
+            return
+        finally:
+            probe.close()
+        raise OSError(errno.EADDRINUSE, "a service is already listening", self.path)
+
+    async def start(self) -> None:
+        """
+        Listen on path. A stale socket there is removed.
+
+        Raises:
+            OSError: if another service listens on path, or path is not a socket
+        """
+        self._remove_stale_socket()
+        self._server = await asyncio.start_unix_server(self._handle, self.path)
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # closing the transports ends the handlers at their next read
+            for writer in self._connections.values():
+                writer.close()
+            if self._connections:
+                await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self) -> HashService:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # connections
+
+    def _client_key(self, writer: asyncio.StreamWriter):
+        # the peer's pid, so all connections of one process share a limit
+        sock = writer.get_extra_info("socket")
+        if hasattr(socket, "SO_PEERCRED") and sock is not None:
+            creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+            return struct.unpack("3i", creds)[0]
+        return id(writer)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        client = self._client_key(writer)
+        limit = self._limits.setdefault(client, [asyncio.Semaphore(self.max_in_flight), 0])
+        limit[1] += 1
+        handler = asyncio.current_task()
+        self._connections[handler] = writer
+        write_lock = asyncio.Lock()
+        tasks: set = set()
+        try:
+            while True:
+                try:
+                    header, payload = await _read_frame(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                await limit[0].acquire()
+                started = time.perf_counter()
+                if header.get("chunked"):
+                    # the chunks follow on this connection, so read them now
+                    await self._serve_stream(header, reader, writer, write_lock, started, limit[0])
+                    continue
+                task = asyncio.ensure_future(
+                    self._serve(header, payload, writer, write_lock, started, limit[0])
+                )
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            limit[1] -= 1
+            if not limit[1]:
+                del self._limits[client]
+            del self._connections[handler]
+            writer.close()
+
+    async def _respond(self, writer, write_lock, header: dict, ok: bool, value) -> None:
+        response = {"id": header.get("id"), "ok": ok}
+        if ok:
+            frame = _frame(response, value)
+        else:
+            response["error"] = value
+            frame = _frame(response)
+        async with write_lock:
+            writer.write(frame)
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
+    async def _serve(self, header, payload, writer, write_lock, started, limit) -> None:
+        try:
+            if header.get("op") == "metrics":
+                ok, value = True, json.dumps(self.metrics.snapshot()).encode()
+            else:
+                job = _job(header) + (payload,)
+                if len(payload) <= self.small_limit:
+                    ok, value = await self._submit_small(job)
+                else:
+                    loop = asyncio.get_running_loop()
+                    (ok, value), = await loop.run_in_executor(self._executor, _run_batch, [job])
+            self.metrics.record(len(payload), time.perf_counter() - started, ok)
+            await self._respond(writer, write_lock, header, ok, value)
+        except Exception as e:
+            await self._respond(writer, write_lock, header, False, "%s: %s" % (type(e).__name__, e))
+        finally:
+            limit.release()
+
+    async def _serve_stream(self, header, reader, writer, write_lock, started, limit) -> None:
+        loop = asyncio.get_running_loop()
+        hasher = error = None
+        *job, output_length = _job(header)
+        try:
+            hasher = _new_hasher(*job)
+            _check_length(hasher, output_length)
+        except Exception as e:
+            error = "%s: %s" % (type(e).__name__, e)
+        size = 0
+        pending = None
+
+        def hash_pieces(pieces):
+            # runs in a thread that only waits for the workers
+            futures = [
+                self._executor.submit(
+                    hash_subtree, bytes(view), counter, hasher.key_words, hasher.flags
+                )
+                for counter, view in pieces
+            ]
+            return [future.result().chaining_value for future in futures]
+
+        async def update(chunk: bytes) -> None:
+            nonlocal hasher
+            if isinstance(hasher, Blake3Hasher):
+                await loop.run_in_executor(
+                    None, hasher.update_subtrees, chunk, hash_pieces, _STREAM_PIECE_CHUNKS
+                )
+            else:
+                hasher = await loop.run_in_executor(self._executor, _update, hasher, chunk)
+
+        async def wait_pending():
+            nonlocal error
+            try:
+                await pending
+            except Exception as e:
+                error = error or "%s: %s" % (type(e).__name__, e)
+
+        try:
+            # after an error the remaining chunks are still read, so the
+            # next request on the connection starts at a frame
+            while True:
+                (length,) = _CHUNK.unpack(await reader.readexactly(_CHUNK.size))
+                if not length:
+                    break
+                chunk = await reader.readexactly(length)
+                size += length
+                if pending is not None:
+                    await wait_pending()
+                    pending = None
+                if error is None:
+                    # hash this chunk in the workers while the next one arrives
+                    pending = asyncio.ensure_future(update(chunk))
+            if pending is not None:
+                await wait_pending()
+            ok, value = (True, _digest(hasher, output_length)) if error is None else (False, error)
+        except Exception as e:
+            ok, value = False, "%s: %s" % (type(e).__name__, e)
+        finally:
+            limit.release()
+        self.metrics.streamed_requests += 1
+        self.metrics.record(size, time.perf_counter() - started, ok)
+        await self._respond(writer, write_lock, header, ok, value)
+
+    # - - - - - - - - - - - - - - - - - - - - - - - - - - -
+    # coalescing of small requests
+
+    def _submit_small(self, job: tuple) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((job, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_delay, self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            self.metrics.batches += 1
+            self.metrics.batched_requests += len(batch)
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch: list) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._executor, _run_batch, [job for job, _ in batch]
+            )
+        except Exception as e:
+            results = [(False, "%s: %s" % (type(e).__name__, e))] * len(batch)
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+
+async def _split(data, chunk_size: int):
+    view = memoryview(data).cast("B")
+    for start in range(0, len(view), chunk_size):
+        yield view[start : start + chunk_size]
+
+
+async def _read_chunks(f, chunk_size: int):
+    # blocking reads run in the default thread pool
+    loop = asyncio.get_running_loop()
+    while True:
+        chunk = await loop.run_in_executor(None, f.read, chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class ServiceError(Exception):
+    """A request failed on the server."""
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.write_lock = asyncio.Lock()
+        self.futures: dict[int, asyncio.Future] = {}
+        self.task = asyncio.ensure_future(self._receive())
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                header, payload = await _read_frame(self.reader)
+                future = self.futures.pop(header["id"], None)
+                if future is None or future.done():
+                    continue
+                if header["ok"]:
+                    future.set_result(payload)
+                else:
+                    future.set_exception(ServiceError(header["error"]))
+        except Exception as e:
+            for future in self.futures.values():
+                if not future.done():
+                    future.set_exception(ConnectionError("connection to the hash service lost: %r" % e))
+            self.futures.clear()
+
+    def is_alive(self) -> bool:
+        # false once the service closed or reset the connection
+        return not self.task.done() and not self.writer.is_closing()
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except OSError:
+            pass
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+
+class Client:
+    """
+    An asyncio client that spreads requests over a pool of connections.
+    Connections carry many requests at once; payloads larger than
+    stream_threshold are sent in chunks.
+
+    Args:
+        path (str): Unix socket path of the service
+        connections (int, optional): pool size. Defaults to 4.
+        stream_threshold (int, optional): payload size from which requests
+            are streamed. Defaults to 1 MiB.
+        chunk_size (int, optional): size of streamed chunks. Defaults to 1 MiB.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        connections: int = 4,
+        stream_threshold: int = 1 << 20,
+        chunk_size: int = 1 << 20,
+    ) -> None:
+        self.path = path
+        self.size = connections
+        self.stream_threshold = stream_threshold
+        self.chunk_size = chunk_size
+        self._connections: list[_Connection] = []
+        self._connect_lock: asyncio.Lock | None = None
+        self._ids = itertools.count()
+        self._next = itertools.cycle(range(connections))
+
+    async def _connection(self) -> _Connection:
+        index = next(self._next)
+        if index < len(self._connections) and self._connections[index].is_alive():
+            return self._connections[index]
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        # one opener at a time; the others find their connection open
+        async with self._connect_lock:
+            while len(self._connections) <= index:
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._connections.append(_Connection(reader, writer))
+            connection = self._connections[index]
+            if not connection.is_alive():
+                # replace a connection lost to a service restart or a reset
+                await connection.close()
+                reader, writer = await asyncio.open_unix_connection(self.path)
+                self._connections[index] = _Connection(reader, writer)
+        return self._connections[index]
+
+    async def _request(self, header: dict, data=b"", chunks=None) -> bytes:
+        connection = await self._connection()
+        header["id"] = request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        connection.futures[request_id] = future
+        if chunks is None and len(data) > self.stream_threshold:
+            chunks = _split(data, self.chunk_size)
+        writer = connection.writer
+        try:
+            async with connection.write_lock:
+                if chunks is None:
+                    writer.write(_frame(header, bytes(data)))
+                else:
+                    header["chunked"] = True
+                    writer.write(_frame(header))
+                    try:
+                        async for chunk in chunks:
+                            writer.write(_CHUNK.pack(len(chunk)))
+                            writer.write(chunk)
+                            await writer.drain()
+                    except BaseException:
+                        # the stream cannot be ended cleanly, so the
+                        # connection is dropped and replaced on next use
+                        writer.close()
+                        raise
+                    writer.write(_CHUNK.pack(0))
+                await writer.drain()
+            return await future
+        finally:
+            connection.futures.pop(request_id, None)
+            if future.done() and not future.cancelled():
+                # mark a connection error as retrieved when the write failed first
+                future.exception()
+
+    async def hash(self, data: bytes, name: str = "blake3", length: int | None = None, **params) -> bytes:
+        """
+        Hash data with any algorithm in newhash.algorithms_available.
+
+        Args:
+            data (bytes): the input
+            name (str, optional): the algorithm. Defaults to "blake3".
+            length (int, optional): output length, required by the
+                extendable-output functions shake_128, shake_256, and
+                blake2xb without a digest_size
+            **params: parameters for newhash.new
+
+        Returns:
+            bytes: the digest
+        """
+        header = {"op": "hash", "name": name, "params": params, "length": length}
+        return await self._request(header, data)
+
+    async def mac(self, key: bytes, data: bytes, name: str = "blake3", length: int | None = None,
+                  **params) -> bytes:
+        """
+        Authenticate data with the keyed mode of BLAKE2b, BLAKE2Xb or BLAKE3,
+        or with HMAC for the other algorithms except SHAKE. Arguments as for hash.
+
+        Returns:
+            bytes: the tag
+        """
+        header = {
+            "op": "mac", "name": name, "params": params, "key": bytes(key).hex(), "length": length,
+        }
+        return await self._request(header, data)
+
+    async def derive_key(self, context: str, key_material: bytes, length: int = 32) -> bytes:
+        """
+        BLAKE3 key derivation.
+
+        Args:
+            context (str): the hardcoded, application-specific context string
+            key_material (bytes): the input key material
+            length (int, optional): length of the derived key. Defaults to 32.
+
+        Returns:
+            bytes: the derived key
+        """
+        header = {"op": "derive_key", "params": {"digest_size": length}, "context": context}
+        return await self._request(header, key_material)
+
+    async def hash_file(self, path: str, name: str = "blake3", length: int | None = None, **params) -> bytes:
+        """
+        Hash a file, streaming it to the service in chunks. The file is read
+        in a thread, so the event loop keeps serving other requests.
+        Arguments as for hash.
+        """
+        header = {"op": "hash", "name": name, "params": params, "length": length}
+        loop = asyncio.get_running_loop()
+        f = await loop.run_in_executor(None, open, path, "rb")
+        try:
+            return await self._request(header, chunks=_read_chunks(f, self.chunk_size))
+        finally:
+            f.close()
+
+    async def metrics(self) -> dict:
+        """Return the service's request, throughput and latency metrics."""
+        return json.loads(await self._request({"op": "metrics"}))
+
+    async def close(self) -> None:
+        for connection in self._connections:
+            await connection.close()
+        self._connections = []
+
+    async def __aenter__(self) -> Client:
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the newhash hashing service.")
+    parser.add_argument("path", help="Unix socket path")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=64)
+    parser.add_argument("--batch-delay", type=float, default=0.001)
+    parser.add_argument("--max-in-flight", type=int, default=16)
+    args = parser.parse_args()
+    service = HashService(
+        args.path,
+        processes=args.processes,
+        max_batch=args.max_batch,
+        batch_delay=args.batch_delay,
+        max_in_flight=args.max_in_flight,
+    )
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()